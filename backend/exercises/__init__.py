@@ -1,9 +1,12 @@
 """Exercise analyzers package.
 
 Each exercise lives in its own module and shares common utilities
-from ``base`` (AngleSmoother, FeedbackStabilizer, calculate_angle).
+from ``base`` (FeedbackStabilizer, TrajectoryBuffer, Stage,
+calculate_angle).
 """
 
+from functools import lru_cache
+
 from .squat import SquatAnalyzer
 from .pushup import PushupAnalyzer
 
@@ -14,13 +17,20 @@ ANALYZER_REGISTRY: dict[str, type] = {
 }
 
 
+@lru_cache(maxsize=8)
+def _analyzer_class(exercise: str) -> type:
+    """Resolve a raw exercise name to its analyzer class (memoized)."""
+    return ANALYZER_REGISTRY.get(exercise.lower().strip(), SquatAnalyzer)
+
+
 def get_analyzer(exercise: str):
     """Return an analyzer instance for the given exercise name.
 
-    Falls back to SquatAnalyzer for unrecognised names.
+    Falls back to SquatAnalyzer for unrecognised names.  Analyzers are
+    stateful, so every call builds a fresh instance; only the name → class
+    lookup is cached.
     """
-    cls = ANALYZER_REGISTRY.get(exercise.lower().strip(), SquatAnalyzer)
-    return cls()
+    return _analyzer_class(exercise)()
 
 
 __all__ = [
@@ -0,0 +1,314 @@
+"""
+Numeric kernels for per-frame angles and batched (pre-recorded) analysis.
+
+The kernels only touch primitive arrays and scalars so they can be
+compiled by Numba.  Numba is optional: without it the per-frame loops
+would run as plain Python, so array-at-a-time NumPy equivalents are used
+instead (``pushup_batch`` picks whichever suits the environment).
+"""
+
+import math
+
+import numpy as np
+
+from .base import calc_angles2
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover – numba not installed
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for ``numba.njit`` when Numba is unavailable."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+
+# Column layout of the push-up kernel output
+PUSHUP_SIDE, PUSHUP_SIDE_VIS, PUSHUP_ELBOW, PUSHUP_BODY = 0, 1, 2, 3
+PUSHUP_PIKE_DEV_SQ, PUSHUP_HIP_ABOVE = 4, 5
+PUSHUP_SHOULDER_X, PUSHUP_SHOULDER_Y, PUSHUP_WRIST_Y = 6, 7, 8
+PUSHUP_COLUMNS = 9
+
+
+@njit(cache=True, fastmath=True)
+def joint_angle(ax, ay, bx, by, cx, cy):
+    """Angle ABC in degrees (b is the vertex), via ``atan2(|cross|, dot)``."""
+    v1x = ax - bx
+    v1y = ay - by
+    v2x = cx - bx
+    v2y = cy - by
+    cross = v1x * v2y - v1y * v2x
+    dot = v1x * v2x + v1y * v2y
+    return math.degrees(math.atan2(abs(cross), dot))
+
+
+@njit(cache=True, fastmath=True)
+def pushup_angles_kernel(pts):
+    """Elbow and body angles from the (5, 2) shoulder/elbow/wrist/hip/ankle block."""
+    sx = pts[0, 0]
+    sy = pts[0, 1]
+    elbow = joint_angle(sx, sy, pts[1, 0], pts[1, 1], pts[2, 0], pts[2, 1])
+    body = joint_angle(sx, sy, pts[3, 0], pts[3, 1], pts[4, 0], pts[4, 1])
+    return elbow, body
+
+
+# (a, vertex, c) rows of the point block: shoulder-elbow-wrist, shoulder-hip-ankle
+_PUSHUP_ANGLE_TRIPLETS = np.array([[0, 1, 2], [0, 3, 4]], dtype=np.intp)
+
+
+def pushup_angles_numpy(pts):
+    """NumPy equivalent of ``pushup_angles_kernel`` for use without Numba."""
+    tri = pts[_PUSHUP_ANGLE_TRIPLETS]   # (2, 3, 2): one gather, column views below
+    elbow, body = calc_angles2(tri[:, 0], tri[:, 1], tri[:, 2]).tolist()
+    return elbow, body
+
+
+@njit(cache=True, fastmath=True)
+def squat_angles_kernel(pts):
+    """Knee and hip angles from the (4, 2) shoulder/hip/knee/ankle block."""
+    hx = pts[1, 0]
+    hy = pts[1, 1]
+    kx = pts[2, 0]
+    ky = pts[2, 1]
+    knee = joint_angle(hx, hy, kx, ky, pts[3, 0], pts[3, 1])
+    hip = joint_angle(pts[0, 0], pts[0, 1], hx, hy, kx, ky)
+    return knee, hip
+
+
+# (a, vertex, c) rows of the point block: hip-knee-ankle, shoulder-hip-knee
+_SQUAT_ANGLE_TRIPLETS = np.array([[1, 2, 3], [0, 1, 2]], dtype=np.intp)
+
+
+def squat_angles_numpy(pts):
+    """NumPy equivalent of ``squat_angles_kernel`` for use without Numba."""
+    tri = pts[_SQUAT_ANGLE_TRIPLETS]
+    knee, hip = calc_angles2(tri[:, 0], tri[:, 1], tri[:, 2]).tolist()
+    return knee, hip
+
+
+# Explicit signature → compiled eagerly at import (and cached on disk), so
+# the first live frame doesn't pay for compilation
+@njit("(float64[:, :], int64, float64, int64, int64, float64[:, :])", cache=True)
+def squat_frame_kernel(lm, sticky_frames, switch_margin, side, side_count, pts):
+    """Sticky side pick, point gather and both angles for one ``(33, 4)`` frame.
+
+    ``side`` is 1 (right), 0 (left) or -1 (not yet picked); the other side
+    only counts towards a switch while its mean visibility leads by more
+    than ``switch_margin``.  Fills ``pts`` with the chosen side's
+    shoulder/hip/knee/ankle and returns ``(side, side_count, side_vis,
+    knee, hip)``.
+    """
+    left_sum = lm[11, 3] + lm[23, 3] + lm[25, 3] + lm[27, 3]
+    right_sum = lm[12, 3] + lm[24, 3] + lm[26, 3] + lm[28, 3]
+    preferred = 1 if right_sum >= left_sum else 0
+
+    if side < 0:
+        side = preferred
+        side_count = 0
+    elif preferred != side and abs(right_sum - left_sum) > 4 * switch_margin:
+        side_count += 1
+        if side_count >= sticky_frames:
+            side = preferred
+            side_count = 0
+    else:
+        side_count = 0
+
+    side_vis = (right_sum if side == 1 else left_sum) / 4
+    # Right-side landmarks are the left-side ids + 1
+    for j, idx in enumerate((11, 23, 25, 27)):
+        pts[j, 0] = lm[idx + side, 1]
+        pts[j, 1] = lm[idx + side, 2]
+    knee, hip = squat_angles_kernel(pts)
+    return side, side_count, side_vis, knee, hip
+
+
+# (2, 4) landmark rows of the left / right (shoulder, hip, knee, ankle)
+_SQUAT_SIDE_POINTS = np.array([[11, 23, 25, 27], [12, 24, 26, 28]], dtype=np.intp)
+
+
+def squat_frame_numpy(lm, sticky_frames, switch_margin, side, side_count, pts):
+    """NumPy equivalent of ``squat_frame_kernel`` for use without Numba."""
+    left_sum, right_sum = lm[_SQUAT_SIDE_POINTS, 3].sum(axis=1).tolist()
+    preferred = 1 if right_sum >= left_sum else 0
+
+    if side < 0:
+        side = preferred
+        side_count = 0
+    elif preferred != side and abs(right_sum - left_sum) > 4 * switch_margin:
+        side_count += 1
+        if side_count >= sticky_frames:
+            side = preferred
+            side_count = 0
+    else:
+        side_count = 0
+
+    side_vis = (right_sum if side == 1 else left_sum) / 4
+    pts[:] = lm[_SQUAT_SIDE_POINTS[side], 1:3]
+    knee, hip = squat_angles_numpy(pts)
+    return side, side_count, side_vis, knee, hip
+
+
+@njit(cache=True, fastmath=True)
+def pushup_batch_kernel(lm, alpha, sticky_frames, strong_margin, recheck_frames,
+                        side, side_count, side_margin, side_skip, elbow, body):
+    """Per-frame push-up geometry for an ``(N, 33, 4)`` landmark array.
+
+    ``side`` is 1 (right), 0 (left) or -1 (not yet picked); ``elbow`` and
+    ``body`` are the smoother states, negative meaning "not yet seeded".
+    ``side_margin`` / ``side_skip`` drive the same strong-margin skip as
+    the live path: while the locked side led by more than
+    ``strong_margin`` at its last full score, the side is only re-scored
+    every ``recheck_frames`` frames.  Returns ``(out, side, side_count,
+    side_margin, side_skip, elbow, body)`` where ``out`` is an
+    ``(N, PUSHUP_COLUMNS)`` array and the scalars are the carried state.
+    """
+    n = lm.shape[0]
+    out = np.empty((n, PUSHUP_COLUMNS))
+    for i in range(n):
+        f = lm[i]
+
+        # ---- Sticky side pick --------------------------------------------
+        left_sum = f[11, 3] + f[13, 3] + f[15, 3] + f[23, 3] + f[27, 3]
+        right_sum = f[12, 3] + f[14, 3] + f[16, 3] + f[24, 3] + f[28, 3]
+        if (side >= 0 and side_count == 0 and side_margin > strong_margin
+                and side_skip < recheck_frames - 1):
+            # Locked side won clearly last time: keep it without re-scoring
+            side_skip += 1
+        else:
+            side_skip = 0
+            preferred = 1 if right_sum >= left_sum else 0
+
+            if side < 0:
+                side = preferred
+                side_count = 0
+            elif preferred != side:
+                side_count += 1
+                if side_count >= sticky_frames:
+                    side = preferred
+                    side_count = 0
+            else:
+                side_count = 0
+            side_margin = right_sum - left_sum if side == 1 else left_sum - right_sum
+
+        if side == 1:
+            s, e, w, h, a = 12, 14, 16, 24, 28
+            side_vis = right_sum / 5
+        else:
+            s, e, w, h, a = 11, 13, 15, 23, 27
+            side_vis = left_sum / 5
+
+        sx, sy = f[s, 1], f[s, 2]
+        hx, hy = f[h, 1], f[h, 2]
+        ax, ay = f[a, 1], f[a, 2]
+
+        # ---- Angles + EMA ------------------------------------------------
+        raw_elbow = joint_angle(sx, sy, f[e, 1], f[e, 2], f[w, 1], f[w, 2])
+        raw_body = joint_angle(sx, sy, hx, hy, ax, ay)
+        elbow = raw_elbow if elbow < 0.0 else alpha * raw_elbow + (1 - alpha) * elbow
+        body = raw_body if body < 0.0 else alpha * raw_body + (1 - alpha) * body
+
+        # ---- Hip pike: squared distance from the shoulder→ankle line -----
+        bdx = ax - sx
+        bdy = ay - sy
+        len_sq = max(bdx * bdx + bdy * bdy, 1.0)
+        t = ((hx - sx) * bdx + (hy - sy) * bdy) / len_sq
+        t = max(0.0, min(1.0, t))
+        ex = sx + t * bdx
+        ey = sy + t * bdy
+
+        out[i, PUSHUP_SIDE] = side
+        out[i, PUSHUP_SIDE_VIS] = side_vis
+        out[i, PUSHUP_ELBOW] = elbow
+        out[i, PUSHUP_BODY] = body
+        out[i, PUSHUP_PIKE_DEV_SQ] = ((hx - ex) ** 2 + (hy - ey) ** 2) / len_sq
+        out[i, PUSHUP_HIP_ABOVE] = 1.0 if hy < ey - 2 else 0.0
+        out[i, PUSHUP_SHOULDER_X] = sx
+        out[i, PUSHUP_SHOULDER_Y] = sy
+        out[i, PUSHUP_WRIST_Y] = f[w, 2]
+    return out, side, side_count, side_margin, side_skip, elbow, body
+
+
+# (2, 5) landmark rows of the left / right (shoulder, elbow, wrist, hip, ankle)
+_PUSHUP_SIDE_POINTS = np.array(
+    [[11, 13, 15, 23, 27], [12, 14, 16, 24, 28]], dtype=np.intp,
+)
+
+
+def pushup_batch_numpy(lm, alpha, sticky_frames, strong_margin, recheck_frames,
+                       side, side_count, side_margin, side_skip, elbow, body):
+    """NumPy equivalent of ``pushup_batch_kernel`` for use without Numba.
+
+    Visibility sums, angles and pike geometry are computed for all frames
+    at once; only the sticky side pick and the EMA – both inherently
+    sequential – loop in Python, over plain floats.
+    """
+    n = lm.shape[0]
+    out = np.empty((n, PUSHUP_COLUMNS))
+    if n == 0:
+        return out, side, side_count, side_margin, side_skip, elbow, body
+
+    # ---- Sticky side pick (sequential) ---------------------------------
+    vis_sums = lm[:, _PUSHUP_SIDE_POINTS, 3].sum(axis=2)     # (N, 2): left, right
+    sides = np.empty(n, dtype=np.intp)
+    for i, (left_sum, right_sum) in enumerate(vis_sums.tolist()):
+        if (side >= 0 and side_count == 0 and side_margin > strong_margin
+                and side_skip < recheck_frames - 1):
+            side_skip += 1      # strong lead: keep the side without re-scoring
+        else:
+            side_skip = 0
+            preferred = 1 if right_sum >= left_sum else 0
+            if side < 0:
+                side = preferred
+                side_count = 0
+            elif preferred != side:
+                side_count += 1
+                if side_count >= sticky_frames:
+                    side = preferred
+                    side_count = 0
+            else:
+                side_count = 0
+            side_margin = right_sum - left_sum if side == 1 else left_sum - right_sum
+        sides[i] = side
+
+    frames = np.arange(n)
+    pts = lm[frames[:, None], _PUSHUP_SIDE_POINTS[sides], 1:3]   # (N, 5, 2)
+    s, e, w, h, a = (pts[:, j] for j in range(5))
+
+    # ---- Angles (vectorised) + EMA (sequential) ------------------------
+    raw_elbow = calc_angles2(s, e, w).tolist()
+    raw_body = calc_angles2(s, h, a).tolist()
+    elbow_s = np.empty(n)
+    body_s = np.empty(n)
+    for i in range(n):
+        elbow = raw_elbow[i] if elbow < 0.0 else alpha * raw_elbow[i] + (1 - alpha) * elbow
+        body = raw_body[i] if body < 0.0 else alpha * raw_body[i] + (1 - alpha) * body
+        elbow_s[i] = elbow
+        body_s[i] = body
+
+    # ---- Hip pike: squared distance from the shoulder→ankle line -------
+    bd = a - s
+    len_sq = np.maximum((bd * bd).sum(axis=1), 1.0)
+    t = np.clip(((h - s) * bd).sum(axis=1) / len_sq, 0.0, 1.0)
+    expected = s + t[:, None] * bd
+    offset = h - expected
+
+    out[:, PUSHUP_SIDE] = sides
+    out[:, PUSHUP_SIDE_VIS] = vis_sums[frames, sides] / 5
+    out[:, PUSHUP_ELBOW] = elbow_s
+    out[:, PUSHUP_BODY] = body_s
+    out[:, PUSHUP_PIKE_DEV_SQ] = (offset * offset).sum(axis=1) / len_sq
+    out[:, PUSHUP_HIP_ABOVE] = h[:, 1] < expected[:, 1] - 2
+    out[:, PUSHUP_SHOULDER_X] = s[:, 0]
+    out[:, PUSHUP_SHOULDER_Y] = s[:, 1]
+    out[:, PUSHUP_WRIST_Y] = w[:, 1]
+    return out, side, side_count, side_margin, side_skip, elbow, body
+
+
+# Compiled kernels when Numba is present, NumPy otherwise
+pushup_angles = pushup_angles_kernel if HAVE_NUMBA else pushup_angles_numpy
+pushup_batch = pushup_batch_kernel if HAVE_NUMBA else pushup_batch_numpy
+squat_angles = squat_angles_kernel if HAVE_NUMBA else squat_angles_numpy
+squat_frame = squat_frame_kernel if HAVE_NUMBA else squat_frame_numpy
@@ -8,34 +8,72 @@ consistent foundation for all exercise types.
 import os
 import sys
 import time
+from enum import IntEnum
+from typing import Callable, Sequence
+
+import numpy as np
 
 # ── Make the parent (backend/) importable so exercises can reach geometry.py ──
 _parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _parent not in sys.path:
     sys.path.insert(0, _parent)
 
-from geometry import calculate_angle  # noqa: F401  – re-exported for exercises
+from geometry import calc_angles2, calculate_angle  # noqa: F401  – re-exported for exercises
 
 
 # ---------------------------------------------------------------------------
-# Smoothing helper – exponential moving average
+# Rep stages – compared as ints, reported to the client as strings
 # ---------------------------------------------------------------------------
-class AngleSmoother:
-    """Exponential moving average for a single angle value."""
+class Stage(IntEnum):
+    UP = 0
+    DESCENDING = 1
+    BOTTOM = 2
+    ASCENDING = 3
 
-    def __init__(self, alpha: float = 0.35):
-        self.alpha = alpha   # higher = more responsive, lower = smoother
-        self.value = None
 
-    def update(self, raw: float) -> float:
-        if self.value is None:
-            self.value = raw
-        else:
-            self.value = self.alpha * raw + (1 - self.alpha) * self.value
-        return self.value
+# Stage → name sent to the front-end
+STAGE_NAMES = ("up", "descending", "bottom", "ascending")
 
-    def reset(self):
-        self.value = None
+# Side id (0 left, 1 right; -1 = not yet picked) → name sent to the front-end
+SIDE_NAMES = ("left", "right")
+
+
+# ---------------------------------------------------------------------------
+# Trajectory history – fixed-size ring buffer of (x, y) points
+# ---------------------------------------------------------------------------
+class TrajectoryBuffer:
+    """Ring buffer of the last ``maxlen`` (x, y) points in one ndarray.
+
+    Drop-in for ``deque(maxlen=N)`` of points: appends write into a
+    preallocated array instead of allocating a node per point, and
+    ``tolist()`` materialises the oldest→newest list in one call.
+    """
+
+    def __init__(self, maxlen: int = 30):
+        self._buf = np.zeros((maxlen, 2), dtype=np.float32)
+        self._idx = 0    # next write slot
+        self._len = 0
+
+    def append(self, point) -> None:
+        buf = self._buf
+        buf[self._idx] = point
+        self._idx = (self._idx + 1) % len(buf)
+        if self._len < len(buf):
+            self._len += 1
+
+    def clear(self) -> None:
+        self._idx = 0
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def tolist(self) -> list[list[float]]:
+        """Points as ``[[x, y], ...]`` ordered oldest → newest."""
+        buf = self._buf
+        if self._len < len(buf):
+            return buf[:self._len].tolist()
+        return np.concatenate((buf[self._idx:], buf[:self._idx])).tolist()
 
 
 # ---------------------------------------------------------------------------
@@ -49,15 +87,32 @@ class FeedbackStabilizer:
     locking active warnings until they are resolved.
     """
 
+    __slots__ = (
+        "warn_messages", "warn_priority", "_warn_rank", "rep_completion_msgs",
+        "candidate_threshold", "feedback_hold_time",
+        "stable_feedback", "stable_feedback_level", "stable_feedback_time",
+        "candidate_feedback", "candidate_count", "active_warning",
+    )
+
     def __init__(
         self,
-        warn_priority: list[str],
+        warn_messages: Sequence[str],
+        warn_priority: list[int],
         rep_completion_msgs: set[str],
         candidate_threshold: int = 5,
         feedback_hold_time: float = 2.5,
         initial_feedback: str = "",
     ):
+        # Warnings are small integer ids; ``warn_messages[id]`` is the text
+        # shown to the user, looked up only once a warning is chosen.
+        self.warn_messages = warn_messages
         self.warn_priority = warn_priority
+        # id → rank (lower = higher priority); ids missing from the priority
+        # list share the lowest rank and fall back to feedback_list order.
+        unranked = len(warn_priority)
+        self._warn_rank = [unranked] * len(warn_messages)
+        for i, warn_id in enumerate(warn_priority):
+            self._warn_rank[warn_id] = i
         self.rep_completion_msgs = rep_completion_msgs
         self.candidate_threshold = candidate_threshold
         self.feedback_hold_time = feedback_hold_time
@@ -68,7 +123,7 @@ class FeedbackStabilizer:
         self.stable_feedback_time: float = 0.0
         self.candidate_feedback: str = ""
         self.candidate_count: int = 0
-        self.active_warning: str | None = None
+        self.active_warning: int | None = None
 
     def reset(self, initial_feedback: str = ""):
         self.stable_feedback = initial_feedback
@@ -80,67 +135,69 @@ class FeedbackStabilizer:
 
     def update(
         self,
-        feedback_list: list[str],
-        warn_counters: dict[str, int],
+        feedback_list: list[int],
+        warn_counters: Sequence[int],
         frame_good_form: bool,
         default_feedback: str,
-        now: float,
+        now_fn: Callable[[], float] = time.monotonic,
     ) -> tuple[str, str]:
         """Process one frame's worth of feedback signals.
 
-        Returns ``(feedback_text, feedback_level)`` suitable for sending
-        to the front-end.
+        ``feedback_list`` holds warning ids and ``warn_counters[id]`` is the
+        debounce counter behind each id.  ``now_fn`` is only called on
+        frames that may change the stable message.  Returns
+        ``(feedback_text, feedback_level)`` suitable for sending to the
+        front-end.
         """
         # ── Check if the currently-locked warning has been resolved ──
         if self.active_warning is not None:
-            counter_val = warn_counters.get(self.active_warning, 0)
-            if counter_val == 0:
+            if warn_counters[self.active_warning] == 0:
                 self.active_warning = None  # resolved → release
 
         # ── Pick which warning to show using priority order ──
-        chosen_warning: str | None = None
+        chosen_warning: int | None = None
         if feedback_list:
-            if self.active_warning and self.active_warning in feedback_list:
+            if self.active_warning is not None and self.active_warning in feedback_list:
                 # Locked warning is still active → keep it
                 chosen_warning = self.active_warning
             else:
-                # Pick the highest-priority warning from the list
-                for w in self.warn_priority:
-                    if w in feedback_list:
-                        chosen_warning = w
-                        break
-                if chosen_warning is None:
+                if len(feedback_list) == 1:
+                    # Common case: a single warning needs no priority search
                     chosen_warning = feedback_list[0]
+                else:
+                    # Pick the highest-priority warning from the list
+                    chosen_warning = min(feedback_list, key=self._warn_rank.__getitem__)
                 self.active_warning = chosen_warning
 
         # ── Determine desired feedback and level ──
-        if chosen_warning:
-            desired_feedback = chosen_warning
+        if chosen_warning is not None:
+            desired_feedback = self.warn_messages[chosen_warning]
             desired_level = "error" if not frame_good_form else "warning"
         else:
             desired_feedback = default_feedback
             desired_level = "success"
             self.active_warning = None  # no warnings → clear lock
 
-        # ── Stabilization: rep-completion messages bypass the candidate gate ──
-        is_priority = desired_feedback in self.rep_completion_msgs
-
         if desired_feedback == self.candidate_feedback:
             self.candidate_count += 1
         else:
             self.candidate_feedback = desired_feedback
             self.candidate_count = 1
 
-        time_since_stable = now - self.stable_feedback_time
-        should_update = (
-            is_priority
-            or self.candidate_count >= self.candidate_threshold
-            or (time_since_stable >= self.feedback_hold_time and self.candidate_count >= 2)
-        )
-
-        if should_update and desired_feedback != self.stable_feedback:
-            self.stable_feedback = desired_feedback
-            self.stable_feedback_level = desired_level
-            self.stable_feedback_time = now
+        # ── Stabilization: rep-completion messages bypass the candidate gate ──
+        if desired_feedback != self.stable_feedback:
+            now = None
+            if (desired_feedback in self.rep_completion_msgs
+                    or self.candidate_count >= self.candidate_threshold):
+                now = now_fn()
+            elif self.candidate_count >= 2:
+                t = now_fn()
+                if t - self.stable_feedback_time >= self.feedback_hold_time:
+                    now = t
+
+            if now is not None:
+                self.stable_feedback = desired_feedback
+                self.stable_feedback_level = desired_level
+                self.stable_feedback_time = now
 
         return self.stable_feedback, self.stable_feedback_level
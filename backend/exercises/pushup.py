@@ -10,13 +10,26 @@ Matches the feature depth of SquatAnalyzer with pushup-specific form checks:
   - Priority-based, debounced, stabilised feedback
 """
 
-import cv2
-import math
 import time
-from collections import deque
 
-from .base import AngleSmoother, FeedbackStabilizer, calculate_angle
+import numpy as np
 
+from . import _kernels as K
+from .base import SIDE_NAMES, STAGE_NAMES, FeedbackStabilizer, Stage, TrajectoryBuffer
+
+
+# Slots of the warning debounce-counter vector
+_BODY, _PIKE, _DEEPER, _LOCKOUT = 0, 1, 2, 3
+
+# Warning ids (index into WARN_MESSAGES), in priority order
+WARN_BODY_BAD, WARN_PIKE, WARN_BODY_MILD, WARN_DEEPER, WARN_LOCKOUT = range(5)
+WARN_MESSAGES = (
+    "Let's keep the body nice and straight",
+    "Try dropping the hips a bit",
+    "Let's engage that core",
+    "Try to lower just a bit more",
+    "Let's lock out at the top",
+)
 
 class PushupAnalyzer:
     """
@@ -24,6 +37,22 @@ class PushupAnalyzer:
     Stages: up (arms extended) -> descending -> bottom -> ascending -> up
     """
 
+    __slots__ = (
+        "stage", "counter", "valid_reps", "invalid_reps", "feedback",
+        "_elbow_val", "_body_val",
+        "shoulder_history", "include_trajectory",
+        "_pts", "_last_pts", "_last_pts_valid", "_result",
+        "_last_rep_time", "_deep_frame_count",
+        "_rep_form_issues", "_rep_had_good_depth",
+        "_current_side", "_side_frame_count", "_side_margin", "_side_skip",
+        "_warn", "_warn_delta", "_stage_handlers", "_stabilizer",
+    )
+
+    # Landmark indices of the (shoulder, elbow, wrist, hip, ankle) block
+    RIGHT_POINTS = np.array([12, 14, 16, 24, 28], dtype=np.intp)
+    LEFT_POINTS  = np.array([11, 13, 15, 23, 27], dtype=np.intp)
+    SIDE_POINTS  = np.stack((LEFT_POINTS, RIGHT_POINTS))   # (2, 5): left, right
+
     # ---- Elbow-angle thresholds with hysteresis band --------------------
     ELBOW_EXTENDED    = 155   # Above this = fully extended (top reset)
     ELBOW_LOCKOUT     = 145   # Must pass on the way up to confirm lockout
@@ -37,6 +66,8 @@ class PushupAnalyzer:
     # ---- Hip pike detection (positional) --------------------------------
     # Fraction of body-length the hip must be above the shoulder->ankle line
     BODY_PIKE_THRESHOLD = 0.06
+    # Compared against the squared deviation, so no sqrt is needed per frame
+    BODY_PIKE_THRESHOLD_SQ = BODY_PIKE_THRESHOLD ** 2
 
     # ---- General thresholds --------------------------------------------
     MIN_VISIBILITY     = 0.50
@@ -44,6 +75,14 @@ class PushupAnalyzer:
     MIN_DEEP_FRAMES    = 2
     SMOOTH_ALPHA       = 0.55
     SIDE_STICKY_FRAMES = 5
+    # Skip scoring the other side while the locked side leads by this much
+    # (summed visibility over 5 landmarks); re-score every Nth frame anyway
+    SIDE_STRONG_MARGIN  = 1.0
+    SIDE_RECHECK_FRAMES = 3
+
+    # ---- Still-pose gate -------------------------------------------------
+    # Max per-coordinate shift (px) for a frame to count as "unchanged"
+    STILL_MAX_SHIFT_PX = 2.0
 
     # ---- Feedback debounce: consecutive frames required to emit ---------
     WARN_FRAMES_BODY    = 6    # Body sag
@@ -55,49 +94,80 @@ class PushupAnalyzer:
     FEEDBACK_HOLD_TIME = 2.5
 
     # Priority order (lower index = higher priority)
-    WARN_PRIORITY = [
-        "Let's keep the body nice and straight",
-        "Try dropping the hips a bit",
-        "Let's engage that core",
-        "Try to lower just a bit more",
-        "Let's lock out at the top",
-    ]
+    WARN_PRIORITY = [WARN_BODY_BAD, WARN_PIKE, WARN_BODY_MILD, WARN_DEEPER, WARN_LOCKOUT]
 
     # ------------------------------------------------------------------
-    def __init__(self):
-        self.stage = "up"        # "up" | "descending" | "bottom" | "ascending"
+    def __init__(self, include_trajectory: bool = True):
+        self.stage = Stage.UP    # UP | DESCENDING | BOTTOM | ASCENDING
         self.counter = 0
         self.valid_reps = 0
         self.invalid_reps = 0
         self.feedback = "Start Push-ups"
 
-        # Smoothers
-        self._elbow_smooth = AngleSmoother(self.SMOOTH_ALPHA)
-        self._body_smooth  = AngleSmoother(self.SMOOTH_ALPHA)
+        # Smoothed (EMA) elbow / body angles, None until the first frame
+        self._elbow_val: float | None = None
+        self._body_val: float | None = None
 
         # Trajectory / history
-        self.shoulder_history = deque(maxlen=30)
+        self.shoulder_history = TrajectoryBuffer(maxlen=30)
+        # When False, "hip_trajectory" stays empty and is never materialised
+        self.include_trajectory = include_trajectory
+
+        # Per-frame (shoulder, elbow, wrist, hip, ankle) xy block
+        self._pts = np.empty((5, 2), dtype=np.float64)
+
+        # Still-pose gate: last fully analysed block (False = none yet)
+        self._last_pts = np.empty((5, 2), dtype=np.float64)
+        self._last_pts_valid: bool = False
+
+        # Result dict, reused (and updated in place) on every frame
+        self._result: dict = {
+            "knee_angle": 0,
+            "hip_angle": 0,
+            "stage": STAGE_NAMES[self.stage],
+            "rep_count": 0,
+            "valid_reps": 0,
+            "invalid_reps": 0,
+            "feedback": self.feedback,
+            "feedback_level": "success",
+            "is_good_form": True,
+            "depth_status": "High",
+            "target_depth_y": 0,
+            "current_depth_y": 0,
+            "hip_trajectory": [],
+            "side_detected": None,
+        }
 
         # Rep-gating state
         self._last_rep_time: float = 0.0
         self._deep_frame_count: int = 0
 
         # Per-rep form tracking
-        self._rep_form_issues: list[str] = []
+        # Warning ids seen this rep; a dict keeps first-seen order
+        self._rep_form_issues: dict[int, None] = {}
         self._rep_had_good_depth: bool = False
 
         # Sticky side detection
-        self._current_side: str | None = None
+        self._current_side: int = -1   # index into SIDE_NAMES, -1 until picked
         self._side_frame_count: int = 0
-
-        # ---- Debounce counters ----
-        self._body_warn_frames: int = 0
-        self._pike_warn_frames: int = 0
-        self._deeper_warn_frames: int = 0
-        self._lockout_warn_frames: int = 0
+        self._side_margin: float = 0.0   # locked-side lead at the last full score
+        self._side_skip: int = 0         # frames since the last full score
+
+        # ---- Debounce counters: body, pike, deeper, lockout ----
+        self._warn = np.zeros(4, dtype=np.int32)
+        self._warn_delta = np.zeros(4, dtype=np.int32)
+
+        # ---- Stage machine: handlers indexed by Stage ----
+        self._stage_handlers = (
+            self._handle_up,
+            self._handle_descending,
+            self._handle_bottom,
+            self._handle_ascending,
+        )
 
         # ---- Feedback stabilization (shared logic from base) ----
         self._stabilizer = FeedbackStabilizer(
+            warn_messages=WARN_MESSAGES,
             warn_priority=self.WARN_PRIORITY,
             rep_completion_msgs={
                 "Nice rep, keep it up!", "Try going a bit lower next one", "Let's tighten that up",
@@ -110,321 +180,453 @@ class PushupAnalyzer:
 
     def reset(self):
         """Resets the analyzer state for a new set."""
-        self.stage = "up"
+        self.stage = Stage.UP
         self.counter = 0
         self.valid_reps = 0
         self.invalid_reps = 0
         self.feedback = "Start Push-ups"
         self.shoulder_history.clear()
-        self._elbow_smooth.reset()
-        self._body_smooth.reset()
+        self._elbow_val = None
+        self._body_val = None
         self._last_rep_time = 0.0
         self._deep_frame_count = 0
-        self._rep_form_issues = []
+        self._rep_form_issues = {}
         self._rep_had_good_depth = False
-        self._current_side = None
+        self._current_side = -1
         self._side_frame_count = 0
-        self._body_warn_frames = 0
-        self._pike_warn_frames = 0
-        self._deeper_warn_frames = 0
-        self._lockout_warn_frames = 0
+        self._side_margin = 0.0
+        self._side_skip = 0
+        self._warn[:] = 0
         self._stabilizer.reset("Start Push-ups")
+        self._last_pts_valid = False
+        self._result["hip_trajectory"] = []
 
     # ------------------------------------------------------------------
     # Main analysis (called by server for every frame)
     # ------------------------------------------------------------------
-    def get_analysis(self, lm_list):
+    def get_analysis(self, lm_list, now: float | None = None):
         """
         Returns structured analysis data (same interface as SquatAnalyzer).
         Maps: knee_angle -> elbow_angle, hip_angle -> body_angle.
+
+        ``lm_list`` is a list of ``[id, x, y, visibility]`` rows or the
+        equivalent ``(N, 4)`` float64 ndarray (used without a copy).
+        ``now`` is the frame's capture time on the ``time.monotonic()``
+        clock (defaults to the current time).
+
+        The returned dict is reused across frames – copy it before
+        mutating it or keeping it past the next call.
         """
         if len(lm_list) < 33:
             return None
 
         # ---- Pick the more-visible side (with stickiness) ----------------
-        # Score ALL landmarks we actually use: shoulder, elbow, wrist, hip, ankle
-        left_vis = (lm_list[11][3] + lm_list[13][3] + lm_list[15][3] + lm_list[23][3] + lm_list[27][3]) / 5
-        right_vis = (lm_list[12][3] + lm_list[14][3] + lm_list[16][3] + lm_list[24][3] + lm_list[28][3]) / 5
-
-        preferred = "right" if right_vis >= left_vis else "left"
-
-        if self._current_side is None:
-            self._current_side = preferred
-            self._side_frame_count = 0
-        elif preferred != self._current_side:
-            self._side_frame_count += 1
-            if self._side_frame_count >= self.SIDE_STICKY_FRAMES:
-                self._current_side = preferred
-                self._side_frame_count = 0
+        # Score ALL landmarks we actually use: shoulder, elbow, wrist, hip, ankle.
+        # Only the comparison matters here, so compare sums; the mean is
+        # taken for the chosen side alone (visibility gate).
+        arr = np.asarray(lm_list, dtype=np.float64)   # one conversion per frame
+        side = self._current_side
+        if (side >= 0
+                and self._side_frame_count == 0
+                and self._side_margin > self.SIDE_STRONG_MARGIN
+                and self._side_skip < self.SIDE_RECHECK_FRAMES - 1):
+            # Locked side won clearly last time: only score that side
+            self._side_skip += 1
+            point_idx = self.SIDE_POINTS[side]
+            side_vis = float(arr[point_idx, 3].sum()) / 5
         else:
-            self._side_frame_count = 0
+            self._side_skip = 0
+            left_sum, right_sum = arr[self.SIDE_POINTS, 3].sum(axis=1).tolist()
 
-        side = self._current_side
+            preferred = int(right_sum >= left_sum)   # 0 left, 1 right
 
-        if side == "right":
-            shoulder = lm_list[12][1:3]
-            elbow    = lm_list[14][1:3]
-            wrist    = lm_list[16][1:3]
-            hip      = lm_list[24][1:3]
-            ankle    = lm_list[28][1:3]
-            side_vis = right_vis
-        else:
-            shoulder = lm_list[11][1:3]
-            elbow    = lm_list[13][1:3]
-            wrist    = lm_list[15][1:3]
-            hip      = lm_list[23][1:3]
-            ankle    = lm_list[27][1:3]
-            side_vis = left_vis
+            if side < 0:
+                side = preferred
+                self._side_frame_count = 0
+            else:
+                # Count frames the other side leads; agreement zeroes it
+                count = (self._side_frame_count + 1) * (preferred ^ side)
+                if count >= self.SIDE_STICKY_FRAMES:
+                    side = preferred
+                    count = 0
+                self._side_frame_count = count
+            self._current_side = side
+
+            point_idx = self.SIDE_POINTS[side]
+            margin = right_sum - left_sum
+            if side:
+                side_vis = right_sum / 5
+                self._side_margin = margin
+            else:
+                side_vis = left_sum / 5
+                self._side_margin = -margin
+        side_used = SIDE_NAMES[side]
+
+        pts = self._pts
+        pts[:] = arr[point_idx, 1:3]
+        shoulder, _elbow, _wrist, hip, ankle = pts
+        shoulder_xy = lm_list[point_idx[0]][1:3]
+        stage = self.stage
+
+        # ---- Raw angles ------------------------------------------------
+        # Elbow (shoulder-elbow-wrist) and body (shoulder-hip-ankle) in one call
+        raw_elbow, raw_body = K.pushup_angles(pts)
+
+        # ---- Smooth angles ---------------------------------------------
+        # Exponential moving average, kept inline as plain floats.
+        # Runs on every frame, including ones the still-pose gate skips
+        a = self.SMOOTH_ALPHA
+        ev = self._elbow_val
+        bv = self._body_val
+        elbow_angle = raw_elbow if ev is None else a * raw_elbow + (1 - a) * ev
+        body_angle  = raw_body if bv is None else a * raw_body + (1 - a) * bv
+        self._elbow_val = elbow_angle
+        self._body_val = body_angle
+
+        wrist_y = lm_list[point_idx[2]][2]
+
+        # ---- Still-pose gate: nothing moved → reuse the last result -----
+        if self._is_still(side_used, pts, elbow_angle, body_angle):
+            self.shoulder_history.append(shoulder_xy)
+            result = self._result
+            result["target_depth_y"] = wrist_y
+            result["current_depth_y"] = shoulder_xy[1]
+            if self.include_trajectory:
+                result["hip_trajectory"] = self.shoulder_history.tolist()
+            return result
+        self._last_pts[:] = pts
+        self._last_pts_valid = True
+
+        # ---- Hip pike geometry (only checked while a rep is in progress)
+        #    Uses true perpendicular distance from the shoulder→ankle body
+        #    axis so it works regardless of frame orientation (portrait or
+        #    landscape, person horizontal or diagonal in view).
+        pike_deviation_sq = 0.0
+        hip_above_line = False
+        if stage != Stage.UP:
+            body = ankle - shoulder
+            body_len_sq = max(float(body @ body), 1.0)
+
+            # Project hip onto the shoulder→ankle line segment
+            t = float((hip - shoulder) @ body) / body_len_sq
+            t = max(0.0, min(1.0, t))
+            expected = shoulder + t * body
 
-        self.shoulder_history.append(shoulder)
+            # Squared perpendicular distance, normalised by body length²
+            offset = hip - expected
+            pike_deviation_sq = float(offset @ offset) / body_len_sq
 
-        # ---- Visibility gate ------------------------------------------
-        low_confidence = side_vis < self.MIN_VISIBILITY
+            # Only flag as pike when hips are *above* the line
+            # (lower Y in image coords = higher in real life)
+            hip_above_line = hip[1] < expected[1] - 2
 
-        # ---- Calculate & smooth angles ---------------------------------
-        raw_elbow = calculate_angle(shoulder, elbow, wrist)
-        raw_body  = calculate_angle(shoulder, hip, ankle)
+        return self._advance(
+            side_used, side_vis, elbow_angle, body_angle,
+            pike_deviation_sq, hip_above_line, shoulder_xy, wrist_y,
+            time.monotonic if now is None else (lambda: now),
+        )
 
-        elbow_angle = self._elbow_smooth.update(raw_elbow)
-        body_angle  = self._body_smooth.update(raw_body)
+    def _is_still(self, side: str, pts: np.ndarray, elbow_angle: float, body_angle: float) -> bool:
+        """True when this frame can reuse the previous result.
 
-        # Angle-based depth
-        is_deep_enough = elbow_angle <= self.ELBOW_DEEP
+        Only quiescent stages qualify (UP between reps, BOTTOM hold),
+        and only once the warning counters and stabilizer have settled.
+        The reused result is an approximation: its angles match the
+        ungated path, but the form checks are not re-run on points that
+        moved by less than STILL_MAX_SHIFT_PX.
+        """
+        stage = self.stage
+        if not self._last_pts_valid or (stage != Stage.UP and stage != Stage.BOTTOM):
+            return False
+        result = self._result
+        if result["side_detected"] != side:
+            return False
+
+        # The smoothers keep running while gated, so the reported whole
+        # degrees stay exact; any change needs a full pass (the stage
+        # thresholds are whole degrees too)
+        if int(elbow_angle) != result["knee_angle"] or int(body_angle) != result["hip_angle"]:
+            return False
+
+        if self._warn.any():
+            return False
+
+        stabilizer = self._stabilizer
+        if not (stabilizer.active_warning is None
+                and stabilizer.stable_feedback == self.feedback
+                and stabilizer.candidate_feedback == self.feedback):
+            return False
+
+        # Last, the only array op: no point drifted from the last analysed
+        # frame by STILL_MAX_SHIFT_PX or more
+        return np.abs(pts - self._last_pts).max() < self.STILL_MAX_SHIFT_PX
+
+    def _advance(
+        self,
+        side: str,
+        side_vis: float,
+        elbow_angle: float,
+        body_angle: float,
+        pike_deviation_sq: float,
+        hip_above_line: bool,
+        shoulder_xy,
+        wrist_y: float,
+        now_fn,
+    ) -> dict:
+        """Run form checks, the rep state machine and feedback for one frame.
+
+        Takes the already-measured (and smoothed) per-frame geometry so the
+        live and batched paths share the same logic.  ``now_fn`` returns the
+        frame timestamp and is only called when a rep or message changes.
+        """
+        self.shoulder_history.append(shoulder_xy)
 
-        shoulder_y = shoulder[1]
-        hip_y      = hip[1]
+        # ---- Visibility gate ------------------------------------------
+        low_confidence = side_vis < self.MIN_VISIBILITY
 
-        now = time.monotonic()
+        # Angle-based depth
+        is_deep_enough = elbow_angle <= self.ELBOW_DEEP
 
         # ---- Real-time form checks (every frame, with debounce) --------
-        feedback_list: list[str] = []
+        feedback_list: list[int] = []
         frame_good_form = True
 
-        actively_pushing = self.stage in ("descending", "bottom", "ascending")
+        stage = self.stage
+        actively_pushing = stage != Stage.UP
 
-        # -- 1. Body alignment: two-tier sag detection (like squat back) --
+        warn = self._warn
         if actively_pushing:
-            if body_angle < self.BODY_BAD_ANGLE:
-                self._body_warn_frames += 1
-            elif body_angle < self.BODY_WARNING_ANGLE:
-                self._body_warn_frames += 1
-            else:
-                self._body_warn_frames = max(0, self._body_warn_frames - 2)
-
-            if self._body_warn_frames >= self.WARN_FRAMES_BODY:
+            # Body-sag and hip-pike debounce in one clipped vector update:
+            # +1 while the fault persists, -2 once it clears.
+            delta = self._warn_delta
+            delta[_BODY] = 1 if body_angle < self.BODY_WARNING_ANGLE else -2
+            pike = hip_above_line and pike_deviation_sq > self.BODY_PIKE_THRESHOLD_SQ
+            delta[_PIKE] = 1 if pike else -2
+            np.add(warn, delta, out=warn)
+            np.maximum(warn, 0, out=warn)
+
+            # -- 1. Body alignment: two-tier sag detection (like squat back) --
+            if warn[_BODY] >= self.WARN_FRAMES_BODY:
                 if body_angle < self.BODY_BAD_ANGLE:
-                    feedback_list.append("Let's keep the body nice and straight")
+                    feedback_list.append(WARN_BODY_BAD)
                     frame_good_form = False
                 else:
-                    feedback_list.append("Let's engage that core")
-        else:
-            self._body_warn_frames = max(0, self._body_warn_frames - 1)
-
-        # -- 2. Hip pike detection (hips too high) -------------------------
-        #    Uses true perpendicular distance from the shoulder→ankle body
-        #    axis so it works regardless of frame orientation (portrait or
-        #    landscape, person horizontal or diagonal in view).
-        if actively_pushing:
-            body_dx = ankle[0] - shoulder[0]
-            body_dy = ankle[1] - shoulder[1]
-            body_length = max(math.hypot(body_dx, body_dy), 1)
+                    feedback_list.append(WARN_BODY_MILD)
 
-            # Project hip onto the shoulder→ankle line segment
-            t = ((hip[0] - shoulder[0]) * body_dx + (hip[1] - shoulder[1]) * body_dy) / (body_length ** 2)
-            t = max(0.0, min(1.0, t))
-            expected_x = shoulder[0] + t * body_dx
-            expected_y = shoulder[1] + t * body_dy
-
-            # Perpendicular distance, normalised by body length
-            pike_deviation = math.hypot(hip[0] - expected_x, hip[1] - expected_y) / body_length
-
-            # Only flag as pike when hips are *above* the line
-            # (lower Y in image coords = higher in real life)
-            hip_above_line = hip[1] < expected_y - 2
-
-            if hip_above_line and pike_deviation > self.BODY_PIKE_THRESHOLD:
-                self._pike_warn_frames += 1
-            else:
-                self._pike_warn_frames = max(0, self._pike_warn_frames - 2)
-
-            if self._pike_warn_frames >= self.WARN_FRAMES_PIKE:
-                feedback_list.append("Try dropping the hips a bit")
+            # -- 2. Hip pike detection (hips too high) ---------------------
+            if warn[_PIKE] >= self.WARN_FRAMES_PIKE:
+                feedback_list.append(WARN_PIKE)
                 frame_good_form = False
         else:
-            self._pike_warn_frames = max(0, self._pike_warn_frames - 1)
+            # Between reps there is nothing to check; body/pike counters
+            # just decay by one per frame (skipped once both are zero).
+            body_pike = warn[_BODY:_PIKE + 1]
+            if body_pike.any():
+                body_pike -= 1
+                np.maximum(body_pike, 0, out=body_pike)
 
         # ---- State machine with 4 stages & hysteresis ------------------
-        if self.stage == "up":
-            if elbow_angle < self.ELBOW_LOCKOUT:
-                # Started descending
-                self.stage = "descending"
-                self._rep_form_issues = []
-                self._rep_had_good_depth = False
-                self._deep_frame_count = 0
-                # Reset warning counters for the new rep
-                self._body_warn_frames = 0
-                self._pike_warn_frames = 0
-                self._deeper_warn_frames = 0
-                self._lockout_warn_frames = 0
-
-        elif self.stage == "descending":
-            # Accumulate form issues while going down
-            if not frame_good_form:
-                for issue in feedback_list:
-                    if issue not in self._rep_form_issues:
-                        self._rep_form_issues.append(issue)
-
-            if elbow_angle <= self.ELBOW_BOTTOM:
-                self._deep_frame_count += 1
-                self._deeper_warn_frames = 0  # deep enough, reset
-            else:
-                self._deep_frame_count = max(0, self._deep_frame_count - 1)
-                # Track how long they've been hovering above depth
-                if elbow_angle < self.ELBOW_LOCKOUT:
-                    self._deeper_warn_frames += 1
-
-            if is_deep_enough:
-                self._rep_had_good_depth = True
-
-            # Show depth cue after hovering above depth
-            if self._deeper_warn_frames >= self.WARN_FRAMES_DEEPER and not is_deep_enough:
-                if "Try to lower just a bit more" not in feedback_list:
-                    feedback_list.append("Try to lower just a bit more")
-
-            if self._deep_frame_count >= self.MIN_DEEP_FRAMES:
-                self.stage = "bottom"
-                self.feedback = "Great depth, push it up!"
-
-            # If they pop back up without going deep enough
-            if elbow_angle > self.ELBOW_EXTENDED:
-                self.stage = "up"
-                self._deep_frame_count = 0
-                self._deeper_warn_frames = 0
-
-        elif self.stage == "bottom":
-            # Still at the bottom - keep tracking form
-            if not frame_good_form:
-                for issue in feedback_list:
-                    if issue not in self._rep_form_issues:
-                        self._rep_form_issues.append(issue)
-
-            if is_deep_enough:
-                self._rep_had_good_depth = True
-
-            if elbow_angle > self.ELBOW_DEEP + 10:
-                # Started coming up (reduced hysteresis for faster detection)
-                self.stage = "ascending"
-
-        elif self.stage == "ascending":
-            if not frame_good_form:
-                for issue in feedback_list:
-                    if issue not in self._rep_form_issues:
-                        self._rep_form_issues.append(issue)
-
-            # Lockout check: not extending fully at top
-            if elbow_angle < self.ELBOW_LOCKOUT and elbow_angle > 120:
-                self._lockout_warn_frames += 1
-            else:
-                self._lockout_warn_frames = max(0, self._lockout_warn_frames - 1)
-
-            if elbow_angle >= self.ELBOW_LOCKOUT:
-                # ---- Rep completed! ------------------------------------
-                time_since_last = now - self._last_rep_time
-
-                if time_since_last >= self.MIN_REP_INTERVAL and not low_confidence:
-                    self.counter += 1
-                    self._last_rep_time = now
-
-                    rep_is_valid = (
-                        len(self._rep_form_issues) == 0
-                        and self._rep_had_good_depth
-                    )
-
-                    if rep_is_valid:
-                        self.valid_reps += 1
-                        self.feedback = "Nice rep, keep it up!"
-                    else:
-                        self.invalid_reps += 1
-                        if not self._rep_had_good_depth:
-                            self.feedback = "Try going a bit lower next one"
-                        elif self._rep_form_issues:
-                            self.feedback = self._rep_form_issues[0]
-                        else:
-                            self.feedback = "Let's tighten that up"
-
-                self.stage = "up"
-                self._deep_frame_count = 0
+        self._stage_handlers[stage](
+            elbow_angle, is_deep_enough, frame_good_form, feedback_list, now_fn, low_confidence,
+        )
 
         # ---- Build final feedback with stabilizer ---------------------
-        warn_counters = {
-            "Let's keep the body nice and straight":   self._body_warn_frames,
-            "Let's engage that core":     self._body_warn_frames,
-            "Try dropping the hips a bit":   self._pike_warn_frames,
-            "Try to lower just a bit more": self._deeper_warn_frames,
-            "Let's lock out at the top":   self._lockout_warn_frames,
-        }
+        # Counters indexed by warning id (both sag tiers share one counter)
+        body_frames, pike_frames, deeper_frames, lockout_frames = warn.tolist()
+        warn_counters = (body_frames, pike_frames, body_frames, deeper_frames, lockout_frames)
 
         stable_feedback, stable_level = self._stabilizer.update(
             feedback_list=feedback_list,
             warn_counters=warn_counters,
             frame_good_form=frame_good_form,
             default_feedback=self.feedback,
-            now=now,
+            now_fn=now_fn,
         )
 
         # DepthLine: target = wrist Y (floor), current = shoulder Y (chest)
-        if side == "right":
-            wrist_y = lm_list[16][2]
-        else:
-            wrist_y = lm_list[15][2]
         target_depth_y = wrist_y
-        current_depth_y = shoulder_y
-
-        return {
-            "knee_angle": int(elbow_angle),      # mapped for UI compatibility
-            "hip_angle": int(body_angle),         # mapped for UI compatibility
-            "stage": self.stage,
-            "rep_count": self.counter,
-            "valid_reps": self.valid_reps,
-            "invalid_reps": self.invalid_reps,
-            "feedback": stable_feedback,
-            "feedback_level": stable_level,
-            "is_good_form": frame_good_form,
-            "depth_status": "Good" if is_deep_enough else "High",
-            "target_depth_y": target_depth_y,
-            "current_depth_y": current_depth_y,
-            "hip_trajectory": list(self.shoulder_history),
-            "side_detected": side,
-        }
+        current_depth_y = shoulder_xy[1]
+
+        result = self._result
+        # Thresholds compare the smoothed floats; the UI shows whole degrees
+        result["knee_angle"] = int(elbow_angle)      # mapped for UI compatibility
+        result["hip_angle"] = int(body_angle)        # mapped for UI compatibility
+        result["stage"] = STAGE_NAMES[self.stage]
+        result["rep_count"] = self.counter
+        result["valid_reps"] = self.valid_reps
+        result["invalid_reps"] = self.invalid_reps
+        result["feedback"] = stable_feedback
+        result["feedback_level"] = stable_level
+        result["is_good_form"] = frame_good_form
+        result["depth_status"] = "Good" if is_deep_enough else "High"
+        result["target_depth_y"] = target_depth_y
+        result["current_depth_y"] = current_depth_y
+        if self.include_trajectory:
+            result["hip_trajectory"] = self.shoulder_history.tolist()
+        result["side_detected"] = side
+        return result
 
     # ------------------------------------------------------------------
-    # Legacy local-webcam method
+    # Stage handlers (dispatched by ``self._stage_handlers``)
     # ------------------------------------------------------------------
-    def analyze(self, img, lm_list):
-        """Original method for local webcam testing with drawing."""
-        if len(lm_list) != 0:
-            left_v = lm_list[11][3] + lm_list[13][3] + lm_list[15][3]
-            right_v = lm_list[12][3] + lm_list[14][3] + lm_list[16][3]
-
-            if right_v >= left_v:
-                shoulder = lm_list[12][1:3]
-                elbow = lm_list[14][1:3]
-                wrist = lm_list[16][1:3]
-            else:
-                shoulder = lm_list[11][1:3]
-                elbow = lm_list[13][1:3]
-                wrist = lm_list[15][1:3]
+    def _record_form_issues(self, feedback_list: list[int]) -> None:
+        """Add this frame's warnings to the current rep's issues (de-duplicated)."""
+        self._rep_form_issues.update(dict.fromkeys(feedback_list))
+
+    def _handle_up(self, elbow_angle, is_deep_enough, frame_good_form, feedback_list, now_fn, low_confidence):
+        if elbow_angle < self.ELBOW_LOCKOUT:
+            # Started descending
+            self.stage = Stage.DESCENDING
+            self._rep_form_issues = {}
+            self._rep_had_good_depth = False
+            self._deep_frame_count = 0
+            # Reset warning counters for the new rep
+            self._warn[:] = 0
+
+    def _handle_descending(self, elbow_angle, is_deep_enough, frame_good_form, feedback_list, now_fn, low_confidence):
+        warn = self._warn
+
+        # Accumulate form issues while going down
+        if not frame_good_form:
+            self._record_form_issues(feedback_list)
+
+        if elbow_angle <= self.ELBOW_BOTTOM:
+            self._deep_frame_count += 1
+            warn[_DEEPER] = 0  # deep enough, reset
+        else:
+            self._deep_frame_count = self._deep_frame_count - 1 if self._deep_frame_count > 1 else 0
+            # Track how long they've been hovering above depth
+            if elbow_angle < self.ELBOW_LOCKOUT:
+                warn[_DEEPER] += 1
+
+        if is_deep_enough:
+            self._rep_had_good_depth = True
+
+        # Show depth cue after hovering above depth
+        if warn[_DEEPER] >= self.WARN_FRAMES_DEEPER and not is_deep_enough:
+            if WARN_DEEPER not in feedback_list:
+                feedback_list.append(WARN_DEEPER)
+
+        if self._deep_frame_count >= self.MIN_DEEP_FRAMES:
+            self.stage = Stage.BOTTOM
+            self.feedback = "Great depth, push it up!"
+
+        # If they pop back up without going deep enough
+        if elbow_angle > self.ELBOW_EXTENDED:
+            self.stage = Stage.UP
+            self._deep_frame_count = 0
+            warn[_DEEPER] = 0
+
+    def _handle_bottom(self, elbow_angle, is_deep_enough, frame_good_form, feedback_list, now_fn, low_confidence):
+        # Still at the bottom - keep tracking form
+        if not frame_good_form:
+            self._record_form_issues(feedback_list)
+
+        if is_deep_enough:
+            self._rep_had_good_depth = True
+
+        if elbow_angle > self.ELBOW_DEEP + 10:
+            # Started coming up (reduced hysteresis for faster detection)
+            self.stage = Stage.ASCENDING
+
+    def _handle_ascending(self, elbow_angle, is_deep_enough, frame_good_form, feedback_list, now_fn, low_confidence):
+        warn = self._warn
 
-            angle_elbow = calculate_angle(shoulder, elbow, wrist)
+        if not frame_good_form:
+            self._record_form_issues(feedback_list)
 
-            cv2.putText(img, str(int(angle_elbow)), (elbow[0] + 10, elbow[1]),
-                        cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
+        # Lockout check: not extending fully at top
+        if elbow_angle < self.ELBOW_LOCKOUT and elbow_angle > 120:
+            warn[_LOCKOUT] += 1
+        elif warn[_LOCKOUT]:
+            warn[_LOCKOUT] -= 1
 
-            if angle_elbow > 150:
-                self.stage = "up"
-            if angle_elbow < 90 and self.stage == "up":
-                self.stage = "down"
+        if elbow_angle >= self.ELBOW_LOCKOUT:
+            # ---- Rep completed! ----------------------------------------
+            now = now_fn()
+            time_since_last = now - self._last_rep_time
+
+            if time_since_last >= self.MIN_REP_INTERVAL and not low_confidence:
                 self.counter += 1
-                print("Push-up count:", self.counter)
+                self._last_rep_time = now
+
+                rep_is_valid = (
+                    len(self._rep_form_issues) == 0
+                    and self._rep_had_good_depth
+                )
+
+                if rep_is_valid:
+                    self.valid_reps += 1
+                    self.feedback = "Nice rep, keep it up!"
+                else:
+                    self.invalid_reps += 1
+                    if not self._rep_had_good_depth:
+                        self.feedback = "Try going a bit lower next one"
+                    elif self._rep_form_issues:
+                        self.feedback = WARN_MESSAGES[next(iter(self._rep_form_issues))]
+                    else:
+                        self.feedback = "Let's tighten that up"
+
+            self.stage = Stage.UP
+            self._deep_frame_count = 0
 
-            return img
+    # ------------------------------------------------------------------
+    # Batched analysis (pre-recorded video)
+    # ------------------------------------------------------------------
+    def get_analysis_batch(self, lm_array, fps: float = 30.0) -> list[dict]:
+        """
+        Analyze a window of frames in one call.
+
+        ``lm_array`` is an ``(N, 33, 4)`` array of ``[id, x, y, visibility]``
+        rows.  The per-frame geometry is computed for the whole window up
+        front (Numba kernel, or NumPy without Numba); the state machine and
+        feedback stabilizer then step through its output in Python.  Frame
+        timestamps are spaced ``1 / fps`` apart.  Returns one result dict
+        per frame, identical in shape to ``get_analysis``.
+        """
+        lm = np.ascontiguousarray(lm_array, dtype=np.float64)
+        if lm.ndim != 3 or lm.shape[1] < 33 or lm.shape[2] < 4:
+            raise ValueError(f"expected an (N, 33, 4) landmark array, got {lm.shape}")
+
+        side_code = self._current_side
+        elbow0 = self._elbow_val
+        body0 = self._body_val
+        out, side_code, side_count, side_margin, side_skip, elbow, body = K.pushup_batch(
+            lm,
+            float(self.SMOOTH_ALPHA),
+            self.SIDE_STICKY_FRAMES,
+            float(self.SIDE_STRONG_MARGIN),
+            self.SIDE_RECHECK_FRAMES,
+            side_code,
+            self._side_frame_count,
+            float(self._side_margin),
+            self._side_skip,
+            -1.0 if elbow0 is None else float(elbow0),
+            -1.0 if body0 is None else float(body0),
+        )
+        if len(out):
+            self._current_side = int(side_code)
+            self._side_frame_count = int(side_count)
+            self._side_margin = float(side_margin)
+            self._side_skip = int(side_skip)
+            self._elbow_val = float(elbow)
+            self._body_val = float(body)
+
+        # The live path's still-pose cache no longer reflects our state
+        self._last_pts_valid = False
+
+        start = time.monotonic()
+        results = []
+        for i, row in enumerate(out.tolist()):
+            results.append(dict(self._advance(
+                SIDE_NAMES[int(row[K.PUSHUP_SIDE])],
+                row[K.PUSHUP_SIDE_VIS],
+                row[K.PUSHUP_ELBOW],
+                row[K.PUSHUP_BODY],
+                row[K.PUSHUP_PIKE_DEV_SQ],
+                row[K.PUSHUP_HIP_ABOVE] == 1.0,
+                [row[K.PUSHUP_SHOULDER_X], row[K.PUSHUP_SHOULDER_Y]],
+                row[K.PUSHUP_WRIST_Y],
+                lambda t=start + i / fps: t,
+            )))
+        return results
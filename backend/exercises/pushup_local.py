@@ -0,0 +1,49 @@
+"""
+Local-webcam push-up analyzer (draws on the frame with OpenCV).
+
+Kept out of ``pushup`` so the server, which only needs ``get_analysis``,
+never imports cv2 through the analyzer.
+"""
+
+import cv2
+
+from .base import Stage, calculate_angle
+from .pushup import PushupAnalyzer
+
+
+class LocalPushupAnalyzer(PushupAnalyzer):
+    """PushupAnalyzer plus the original draw-on-image ``analyze`` method."""
+
+    __slots__ = ()
+
+    # ------------------------------------------------------------------
+    # Legacy local-webcam method
+    # ------------------------------------------------------------------
+    def analyze(self, img, lm_list):
+        """Original method for local webcam testing with drawing."""
+        if len(lm_list) != 0:
+            left_v = lm_list[11][3] + lm_list[13][3] + lm_list[15][3]
+            right_v = lm_list[12][3] + lm_list[14][3] + lm_list[16][3]
+
+            if right_v >= left_v:
+                shoulder = lm_list[12][1:3]
+                elbow = lm_list[14][1:3]
+                wrist = lm_list[16][1:3]
+            else:
+                shoulder = lm_list[11][1:3]
+                elbow = lm_list[13][1:3]
+                wrist = lm_list[15][1:3]
+
+            angle_elbow = calculate_angle(shoulder, elbow, wrist)
+
+            cv2.putText(img, str(int(angle_elbow)), (elbow[0] + 10, elbow[1]),
+                        cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
+
+            if angle_elbow > 150:
+                self.stage = Stage.UP
+            if angle_elbow < 90 and self.stage == Stage.UP:
+                self.stage = Stage.BOTTOM
+                self.counter += 1
+                print("Push-up count:", self.counter)
+
+            return img
@@ -1,10 +1,11 @@
-import cv2
 import math
 import random
 import time
-from collections import deque
 
-from .base import AngleSmoother, calculate_angle
+import numpy as np
+
+from . import _kernels as K
+from .base import SIDE_NAMES, STAGE_NAMES, FeedbackStabilizer, Stage, TrajectoryBuffer
 
 # Success messages for valid reps (randomized for variety)
 REP_SUCCESS_MESSAGES = [
@@ -28,8 +29,67 @@ REP_INVALID_MESSAGES = {
     ],
 }
 
+# Default messages (one shared object each, so the stabilizer's string
+# comparisons against them short-circuit on identity)
+START_MESSAGE = "Start Squatting"
+DEPTH_REACHED_MESSAGE = "Great depth, drive it up!"
+
+# Rep-completion messages bypass the feedback candidate gate
+REP_COMPLETION_MSGS = frozenset(
+    REP_SUCCESS_MESSAGES
+    + REP_INVALID_MESSAGES["depth"]
+    + REP_INVALID_MESSAGES["form"]
+    + REP_INVALID_MESSAGES["generic"]
+    + [DEPTH_REACHED_MESSAGE]
+)
+
+# Output dict layout; each analyzer keeps one copy and refills it per frame
+_RESULT_TEMPLATE = {
+    "knee_angle": 0,
+    "hip_angle": 0,
+    "stage": "up",
+    "rep_count": 0,
+    "valid_reps": 0,
+    "invalid_reps": 0,
+    "feedback": "",
+    "feedback_level": "success",
+    "is_good_form": True,
+    "depth_status": "High",
+    "target_depth_y": 0,
+    "current_depth_y": 0,
+    "hip_trajectory": [],
+    "side_detected": None,
+}
+
+# depth_status text, indexed by is_deep_enough
+DEPTH_STATUS = ("High", "Good")
+
+# Slots of the warning debounce-counter vector
+_BACK, _KNEE_TOE, _DEEPER = 0, 1, 2
+
+# Warning ids (index into WARN_MESSAGES), in priority order
+WARN_CHEST_BAD, WARN_SIT_BACK, WARN_CHEST_MILD, WARN_DEEPER = range(4)
+WARN_MESSAGES = (
+    "Let's lift that chest up",
+    "Try sitting back a bit",
+    "Nice, just a little more chest lift",
+    "Let's go a bit deeper",
+)
+
 
 class SquatAnalyzer:
+    __slots__ = (
+        "stage", "counter", "valid_reps", "invalid_reps", "feedback",
+        "_knee_val", "_hip_val",
+        "hip_history", "include_trajectory",
+        "_pts", "_last_pts", "_result",
+        "_last_rep_time", "_deep_frame_count",
+        "_rep_form_issues", "_rep_had_good_depth",
+        "_current_side", "_side_frame_count",
+        "_warn", "_stage_handlers", "_stabilizer",
+        "_standing_confirmed", "_reached_standing",
+    )
+
     # ---- Thresholds (class-level constants) --------------------------------
     # Knee-angle thresholds with hysteresis band
     KNEE_STANDING_ANGLE   = 155   # Above this = fully standing (reset)
@@ -58,6 +118,13 @@ class SquatAnalyzer:
 
     # Side-stickiness: minimum frames before switching detected side
     SIDE_STICKY_FRAMES    = 5
+    # ...and the other side only counts as dominant when its mean
+    # visibility leads by more than this (hysteresis band)
+    SIDE_SWITCH_MARGIN    = 0.05
+
+    # Still-frame reuse: max per-coordinate shift (px) from the last
+    # analysed frame for a quiescent frame to reuse its result
+    STILL_MAX_SHIFT_PX    = 2.0
 
     # ---- Feedback debounce: consecutive frames required to emit a warning ---
     WARN_FRAMES_BACK      = 6   # chest lift warning needs 6 bad frames in a row
@@ -70,50 +137,68 @@ class SquatAnalyzer:
     # Priority order for warnings (lower index = higher priority).
     # When multiple warnings fire, only the highest-priority one is shown.
     # Once shown, it stays until resolved (counter drops to 0).
-    WARN_PRIORITY = ["Let's lift that chest up", "Try sitting back a bit",
-                     "Nice, just a little more chest lift", "Let's go a bit deeper"]
+    WARN_PRIORITY = [WARN_CHEST_BAD, WARN_SIT_BACK, WARN_CHEST_MILD, WARN_DEEPER]
 
-    def __init__(self):
-        self.stage = "up"        # "up" | "descending" | "bottom" | "ascending"
+    def __init__(self, include_trajectory: bool = True):
+        self.stage = Stage.UP    # UP | DESCENDING | BOTTOM | ASCENDING
         self.counter = 0
         self.valid_reps = 0
         self.invalid_reps = 0
-        self.feedback = "Start Squatting"
+        self.feedback = START_MESSAGE
 
-        # Smoothers
-        self._knee_smooth = AngleSmoother(self.SMOOTH_ALPHA)
-        self._hip_smooth  = AngleSmoother(self.SMOOTH_ALPHA)
+        # Smoothed (EMA) knee / hip angles, None until the first frame
+        self._knee_val: float | None = None
+        self._hip_val: float | None = None
 
         # Trajectory / history
-        self.hip_history = deque(maxlen=30)
+        self.hip_history = TrajectoryBuffer(maxlen=30)
+
+        # Result dict, reused (and updated in place) on every frame
+        self._result: dict = _RESULT_TEMPLATE.copy()
+        # When False, "hip_trajectory" stays empty and is never materialised
+        self.include_trajectory = include_trajectory
+
+        # Per-frame (shoulder, hip, knee, ankle) xy block
+        self._pts = np.empty((4, 2), dtype=np.float64)
+
+        # Still-frame gate: last fully analysed block
+        self._last_pts = np.empty((4, 2), dtype=np.float64)
 
         # Rep-gating state
         self._last_rep_time: float = 0.0
         self._deep_frame_count: int = 0
 
         # Per-rep form tracking – accumulate issues across the whole rep
-        self._rep_form_issues: list[str] = []
+        self._rep_form_issues: set[int] = set()   # warning ids seen this rep
         self._rep_had_good_depth: bool = False
 
         # Sticky side detection – avoids oscillating between left/right
-        self._current_side: str | None = None
+        self._current_side: int = -1   # index into SIDE_NAMES, -1 until picked
         self._side_frame_count: int = 0
 
         # ---- Debounce counters for each form warning ----
-        self._back_warn_frames: int = 0
-        self._knee_toe_warn_frames: int = 0
-        self._deeper_warn_frames: int = 0
-
-        # ---- Feedback stabilization ----
-        self._stable_feedback: str = "Start Squatting"
-        self._stable_feedback_level: str = "success"
-        self._stable_feedback_time: float = 0.0
-        self._candidate_feedback: str = ""
-        self._candidate_count: int = 0
-        self._candidate_threshold: int = 5  # frames of same message to promote
+        # Plain list indexed by _BACK/_KNEE_TOE/_DEEPER: three small ints
+        # update faster in Python than through NumPy ufunc calls
+        self._warn: list[int] = [0, 0, 0]        # back, knee-over-toe, deeper
+
+        # ---- Feedback stabilization (shared logic from base) ----
+        # Ranks warnings by WARN_PRIORITY and locks the active one until resolved
+        self._stabilizer = FeedbackStabilizer(
+            warn_messages=WARN_MESSAGES,
+            warn_priority=self.WARN_PRIORITY,
+            rep_completion_msgs=REP_COMPLETION_MSGS,
+            candidate_threshold=5,
+            feedback_hold_time=self.FEEDBACK_HOLD_TIME,
+            initial_feedback=START_MESSAGE,
+        )
 
-        # Active-warning lock: once a warning is shown, it stays until resolved
-        self._active_warning: str | None = None
+        # ---- Stage machine: handlers indexed by Stage ----
+        self._stage_handlers = (
+            self._handle_up,
+            self._handle_descending,
+            self._handle_bottom,
+            self._handle_ascending,
+        )
 
         # ---- Rep-gating: standing confirmation & hysteresis ----
         # Must detect a standing pose before the state machine starts tracking
@@ -123,142 +208,157 @@ class SquatAnalyzer:
 
     def reset(self):
         """Resets the analyzer state for a new set."""
-        self.stage = "up"
+        self.stage = Stage.UP
         self.counter = 0
         self.valid_reps = 0
         self.invalid_reps = 0
-        self.feedback = "Start Squatting"
+        self.feedback = START_MESSAGE
         self.hip_history.clear()
-        self._knee_smooth.reset()
-        self._hip_smooth.reset()
+        self._knee_val = None
+        self._hip_val = None
         self._last_rep_time = 0.0
         self._deep_frame_count = 0
-        self._rep_form_issues = []
+        self._rep_form_issues = set()
         self._rep_had_good_depth = False
-        self._current_side = None
+        self._current_side = -1
         self._side_frame_count = 0
-        self._back_warn_frames = 0
-        self._knee_toe_warn_frames = 0
-        self._deeper_warn_frames = 0
-        self._stable_feedback = "Start Squatting"
-        self._stable_feedback_level = "success"
-        self._stable_feedback_time = 0.0
-        self._candidate_feedback = ""
-        self._candidate_count = 0
-        self._active_warning = None
+        self._warn[:] = (0, 0, 0)
+        self._stabilizer.reset(START_MESSAGE)
         self._standing_confirmed = False
         self._reached_standing = False
+        self._result["hip_trajectory"] = []
 
     # ------------------------------------------------------------------
     # Main analysis (called by server for every frame)
     # ------------------------------------------------------------------
-    def get_analysis(self, lm_list):
+    def get_analysis(self, lm_list, now: float | None = None):
         """
         Returns structured analysis data without drawing on image.
         Used by the server to send data to the mobile app.
+
+        ``lm_list`` is a list of ``[id, x, y, visibility]`` rows or the
+        equivalent ``(N, 4)`` ndarray.  ``now`` is the frame's capture time
+        on the ``time.monotonic()`` clock (defaults to the current time).
+
+        The returned dict is reused across frames – copy it before
+        mutating it or keeping it past the next call.
         """
         if len(lm_list) < 33:
             return None
 
-        # ---- Pick the more-visible side (with stickiness) ----------------
-        left_visibility = (lm_list[11][3] + lm_list[23][3] + lm_list[25][3] + lm_list[27][3]) / 4
-        right_visibility = (lm_list[12][3] + lm_list[24][3] + lm_list[26][3] + lm_list[28][3]) / 4
-
-        preferred_side = "right" if right_visibility >= left_visibility else "left"
-
-        # Sticky side: only switch if the other side has been dominant for
-        # several consecutive frames to prevent jitter.
-        if self._current_side is None:
-            self._current_side = preferred_side
-            self._side_frame_count = 0
-        elif preferred_side != self._current_side:
-            self._side_frame_count += 1
-            if self._side_frame_count >= self.SIDE_STICKY_FRAMES:
-                self._current_side = preferred_side
-                self._side_frame_count = 0
-        else:
-            self._side_frame_count = 0
-
-        side_used = self._current_side
-
-        if side_used == "right":
-            shoulder = lm_list[12][1:3]
-            hip      = lm_list[24][1:3]
-            knee     = lm_list[26][1:3]
-            ankle    = lm_list[28][1:3]
-            side_vis = right_visibility
-        else:
-            shoulder = lm_list[11][1:3]
-            hip      = lm_list[23][1:3]
-            knee     = lm_list[25][1:3]
-            ankle    = lm_list[27][1:3]
-            side_vis = left_visibility
-
-        self.hip_history.append(hip)
+        # ---- Side pick, point gather and raw angles ---------------------
+        # One compiled call: mean visibility of shoulder, hip, knee, ankle
+        # on both sides (ties go right), sticky side switch – only after the
+        # other side has led by a clear margin for several consecutive
+        # frames, to prevent jitter – then the knee (hip-knee-ankle) and hip
+        # (shoulder-hip-knee) angles of the chosen side
+        arr = np.asarray(lm_list, dtype=np.float64)   # one conversion per frame
+        pts = self._pts
+        side, self._side_frame_count, side_vis, raw_knee, raw_hip = K.squat_frame(
+            arr, self.SIDE_STICKY_FRAMES, self.SIDE_SWITCH_MARGIN,
+            self._current_side, self._side_frame_count, pts,
+        )
+        self._current_side = side
+        side_used = SIDE_NAMES[side]
+        _shoulder, (hip_x, hip_y), (knee_x, knee_y), (ankle_x, ankle_y) = pts.tolist()
+
+        self.hip_history.append((hip_x, hip_y))
+
+        # ---- Smooth angles ---------------------------------------------
+        # Exponential moving average, kept inline as plain floats.
+        # Runs on every frame, including ones the still-pose gate skips
+        a = self.SMOOTH_ALPHA
+        kv = self._knee_val
+        hv = self._hip_val
+        knee_angle = raw_knee if kv is None else a * raw_knee + (1 - a) * kv
+        hip_angle  = raw_hip if hv is None else a * raw_hip + (1 - a) * hv
+        self._knee_val = knee_angle
+        self._hip_val = hip_angle
+
+        # ---- Pose held still (or re-sent) → reuse the previous result ---
+        if kv is not None and self._is_still(side_used, pts, knee_angle, hip_angle):
+            result = self._result
+            result["target_depth_y"] = knee_y
+            result["current_depth_y"] = hip_y
+            if self.include_trajectory:
+                result["hip_trajectory"] = self.hip_history.tolist()
+            return result
+        self._last_pts[:] = pts
 
         # ---- Visibility gate ------------------------------------------
         low_confidence = side_vis < self.MIN_VISIBILITY
 
-        # ---- Calculate & smooth angles ---------------------------------
-        raw_knee = calculate_angle(hip, knee, ankle)
-        raw_hip  = calculate_angle(shoulder, hip, knee)
-        knee_angle = self._knee_smooth.update(raw_knee)
-        hip_angle  = self._hip_smooth.update(raw_hip)
-
         # Angle-based depth (more reliable than pixel comparison)
         is_deep_enough = knee_angle <= self.KNEE_DEEP_ANGLE
 
-        hip_y  = hip[1]
-        knee_y = knee[1]
-
-        now = time.monotonic()
+        # ---- Idle standing → skip form checks, handler and stabilizer ---
+        # With every counter at zero and the message settled, UP-stage form
+        # checks only decay zeros, _handle_up only re-marks standing, and
+        # the stabilizer keeps its message; just refresh the outputs
+        if (self.stage == Stage.UP and knee_angle >= self.KNEE_STANDING_ANGLE
+                and self._standing_confirmed and self._is_settled()):
+            self._reached_standing = True
+            return self._build_result(
+                knee_angle, hip_angle, True, is_deep_enough,
+                knee_y, hip_y, side_used,
+            )
+
+        if now is None:
+            now = time.monotonic()
 
         # ---- Real-time form checks (every frame, with debounce) --------
-        feedback_list: list[str] = []
+        feedback_list: list[int] = []
         frame_good_form = True
 
         # Only run form checks when actively squatting (not standing idle)
-        actively_squatting = self.stage in ("descending", "bottom", "ascending")
+        stage = self.stage
+        actively_squatting = stage != Stage.UP
+
+        # Debounce: +1 while a fault persists, then a per-check decay once
+        # it clears (or while the check does not apply to the current stage)
+        warn = self._warn
+        back_frames, knee_toe_frames, _ = warn
 
-        # Back angle checks (two tiers) – only during active squat
+        # Back angle (two tiers) – only during active squat
         if actively_squatting:
-            if hip_angle < self.BACK_BAD_ANGLE:
-                self._back_warn_frames += 1
-            elif hip_angle < self.BACK_WARNING_ANGLE:
-                self._back_warn_frames += 1
+            if hip_angle < self.BACK_WARNING_ANGLE:   # either tier counts
+                back_frames += 1
             else:
-                self._back_warn_frames = max(0, self._back_warn_frames - 2)  # decay faster than buildup
+                back_frames = back_frames - 2 if back_frames > 2 else 0  # decay faster than buildup
 
-            if self._back_warn_frames >= self.WARN_FRAMES_BACK:
+            if back_frames >= self.WARN_FRAMES_BACK:
                 if hip_angle < self.BACK_BAD_ANGLE:
-                    feedback_list.append("Let's lift that chest up")
+                    feedback_list.append(WARN_CHEST_BAD)
                     frame_good_form = False
                 else:
-                    feedback_list.append("Nice, just a little more chest lift")
+                    feedback_list.append(WARN_CHEST_MILD)
         else:
-            self._back_warn_frames = max(0, self._back_warn_frames - 1)
+            back_frames = back_frames - 1 if back_frames > 1 else 0
 
         # Forward knee travel (side view) – use ratio of shin length
-        if self.stage in ("descending", "bottom"):
-            knee_x, ankle_x = knee[0], ankle[0]
-            shin_len = max(math.hypot(knee[0] - ankle[0], knee[1] - ankle[1]), 1)
-            forward_travel = abs(knee_x - ankle_x)
-            travel_ratio = forward_travel / shin_len
+        if stage == Stage.DESCENDING or stage == Stage.BOTTOM:
+            # Ankle→knee shin vector, shared by the length and travel terms
+            shin_dx = knee_x - ankle_x
+            shin_len = max(math.hypot(shin_dx, knee_y - ankle_y), 1)
+            travel_ratio = abs(shin_dx) / shin_len
 
             if travel_ratio > self.KNEE_OVER_TOE_RATIO:
-                if (side_used == "right" and knee_x > ankle_x) or \
-                   (side_used == "left" and knee_x < ankle_x):
-                    self._knee_toe_warn_frames += 1
+                # Knee ahead of the ankle, in the direction the person faces
+                if (shin_dx > 0) if side else (shin_dx < 0):
+                    knee_toe_frames += 1
                 else:
-                    self._knee_toe_warn_frames = max(0, self._knee_toe_warn_frames - 1)
+                    knee_toe_frames = knee_toe_frames - 1 if knee_toe_frames > 1 else 0
             else:
-                self._knee_toe_warn_frames = max(0, self._knee_toe_warn_frames - 2)
+                knee_toe_frames = knee_toe_frames - 2 if knee_toe_frames > 2 else 0
 
-            if self._knee_toe_warn_frames >= self.WARN_FRAMES_KNEE_TOE:
-                feedback_list.append("Try sitting back a bit")
+            if knee_toe_frames >= self.WARN_FRAMES_KNEE_TOE:
+                feedback_list.append(WARN_SIT_BACK)
                 frame_good_form = False
         else:
-            self._knee_toe_warn_frames = max(0, self._knee_toe_warn_frames - 1)
+            knee_toe_frames = knee_toe_frames - 1 if knee_toe_frames > 1 else 0
+
+        warn[_BACK] = back_frames
+        warn[_KNEE_TOE] = knee_toe_frames
 
         # ---- Standing confirmation gate --------------------------------
         # Require the person to first be detected standing before tracking.
@@ -269,252 +369,208 @@ class SquatAnalyzer:
                 self._reached_standing = True
             else:
                 # Not yet confirmed standing – skip state machine entirely
-                return {
-                    "knee_angle": int(knee_angle),
-                    "hip_angle": int(hip_angle),
-                    "stage": self.stage,
-                    "rep_count": self.counter,
-                    "valid_reps": self.valid_reps,
-                    "invalid_reps": self.invalid_reps,
-                    "feedback": self._stable_feedback,
-                    "feedback_level": self._stable_feedback_level,
-                    "is_good_form": frame_good_form,
-                    "depth_status": "Good" if is_deep_enough else "High",
-                    "target_depth_y": knee_y,
-                    "current_depth_y": hip_y,
-                    "hip_trajectory": list(self.hip_history),
-                    "side_detected": side_used,
-                }
+                return self._build_result(
+                    knee_angle, hip_angle, frame_good_form, is_deep_enough,
+                    knee_y, hip_y, side_used,
+                )
 
         # ---- State machine with 4 stages & hysteresis ------------------
-        if self.stage == "up":
-            # Track whether the person has reached full standing after a rep.
-            # This adds a hysteresis band (145° lockout → 155° standing)
-            # that prevents oscillation near the lockout threshold from
-            # triggering a phantom descent cycle.
-            if knee_angle >= self.KNEE_STANDING_ANGLE:
-                self._reached_standing = True
+        self._stage_handlers[stage](
+            knee_angle, is_deep_enough, frame_good_form, feedback_list, now, low_confidence,
+        )
 
-            if self._reached_standing and knee_angle < self.KNEE_LOCKOUT_ANGLE:
-                # Started descending
-                self.stage = "descending"
-                self._reached_standing = False
-                self._rep_form_issues = []
-                self._rep_had_good_depth = False
-                self._deep_frame_count = 0
-                # Reset warning counters for the new rep
-                self._back_warn_frames = 0
-                self._knee_toe_warn_frames = 0
-                self._deeper_warn_frames = 0
-
-        elif self.stage == "descending":
-            # Accumulate form issues while going down
-            if not frame_good_form:
-                for issue in feedback_list:
-                    if issue not in self._rep_form_issues:
-                        self._rep_form_issues.append(issue)
-
-            if knee_angle <= self.KNEE_DEEP_ANGLE:
-                self._deep_frame_count += 1
-                self._deeper_warn_frames = 0  # they're deep enough, reset
-            else:
-                self._deep_frame_count = max(0, self._deep_frame_count - 1)
-                # Track how long they've been in a "not deep enough" zone
-                if knee_angle < self.KNEE_LOCKOUT_ANGLE:
-                    self._deeper_warn_frames += 1
-
-            if is_deep_enough:
-                self._rep_had_good_depth = True
-
-            # Only show depth cue if they've been hovering above depth for a while
-            if self._deeper_warn_frames >= self.WARN_FRAMES_DEEPER and not is_deep_enough:
-                if "Let's go a bit deeper" not in feedback_list:
-                    feedback_list.append("Let's go a bit deeper")
-
-            if self._deep_frame_count >= self.MIN_DEEP_FRAMES:
-                self.stage = "bottom"
-                self.feedback = "Great depth, drive it up!"
-
-            # If they pop back up without going deep enough
-            if knee_angle > self.KNEE_STANDING_ANGLE:
-                self.stage = "up"
-                self._deep_frame_count = 0
-                self._deeper_warn_frames = 0
-
-        elif self.stage == "bottom":
-            # Still at the bottom – keep tracking form
-            if not frame_good_form:
-                for issue in feedback_list:
-                    if issue not in self._rep_form_issues:
-                        self._rep_form_issues.append(issue)
-
-            if is_deep_enough:
-                self._rep_had_good_depth = True
-
-            if knee_angle > self.KNEE_DEEP_ANGLE + 10:
-                # They've started coming up (reduced hysteresis for faster detection)
-                self.stage = "ascending"
-
-        elif self.stage == "ascending":
-            if not frame_good_form:
-                for issue in feedback_list:
-                    if issue not in self._rep_form_issues:
-                        self._rep_form_issues.append(issue)
+        # ---- Build final feedback with stabilizer ---------------------
+        # Counters indexed by warning id (both chest tiers share one counter)
+        back_frames, knee_toe_frames, deeper_frames = warn
+        self._stabilizer.update(
+            feedback_list=feedback_list,
+            warn_counters=(back_frames, knee_toe_frames, back_frames, deeper_frames),
+            frame_good_form=frame_good_form,
+            default_feedback=self.feedback,
+            now_fn=lambda: now,
+        )
 
-            if knee_angle >= self.KNEE_STANDING_ANGLE:
-                # ---- Rep completed! ------------------------------------
-                time_since_last = now - self._last_rep_time
-
-                if time_since_last >= self.MIN_REP_INTERVAL and not low_confidence:
-                    self.counter += 1
-                    self._last_rep_time = now
-
-                    # "Let's go a bit deeper" is guidance during descent, not a form error.
-                    # If they followed through and achieved good depth, exclude it.
-                    actual_form_issues = [
-                        issue for issue in self._rep_form_issues
-                        if issue != "Let's go a bit deeper" or not self._rep_had_good_depth
-                    ]
-
-                    rep_is_valid = (
-                        len(actual_form_issues) == 0
-                        and self._rep_had_good_depth
-                    )
-
-                    if rep_is_valid:
-                        self.valid_reps += 1
-                        self.feedback = random.choice(REP_SUCCESS_MESSAGES)
-                    else:
-                        self.invalid_reps += 1
-                        if not self._rep_had_good_depth:
-                            self.feedback = random.choice(REP_INVALID_MESSAGES["depth"])
-                        elif actual_form_issues:
-                            self.feedback = random.choice(REP_INVALID_MESSAGES["form"])
-                        else:
-                            self.feedback = random.choice(REP_INVALID_MESSAGES["generic"])
-
-                    # Force-update stable feedback so rep result always displays
-                    # (overrides mid-rep cues like "Great depth, drive it up!")
-                    self._stable_feedback = self.feedback
-                    self._stable_feedback_level = 'success' if rep_is_valid else 'warning'
-                    self._stable_feedback_time = now
-
-                self.stage = "up"
-                self._deep_frame_count = 0
-
-        # ---- Build final feedback with warning-lock logic -----------------
-        # Map warnings to their debounce counters so we can check "resolved"
-        _warn_counter = {
-            "Let's lift that chest up": self._back_warn_frames,
-            "Nice, just a little more chest lift": self._back_warn_frames,
-            "Try sitting back a bit": self._knee_toe_warn_frames,
-            "Let's go a bit deeper": self._deeper_warn_frames,
-        }
-
-        # If the currently-locked warning is still in the feedback list, keep it.
-        # If it has been resolved (counter dropped to 0), release the lock.
-        if self._active_warning is not None:
-            counter_val = _warn_counter.get(self._active_warning, 0)
-            if counter_val == 0:
-                self._active_warning = None  # resolved → release
-
-        # Pick which warning to show using priority order
-        chosen_warning: str | None = None
-        if feedback_list:
-            if self._active_warning and self._active_warning in feedback_list:
-                # Locked warning is still active → keep it
-                chosen_warning = self._active_warning
-            else:
-                # Pick the highest-priority warning from the list
-                for w in self.WARN_PRIORITY:
-                    if w in feedback_list:
-                        chosen_warning = w
-                        break
-                if chosen_warning is None:
-                    chosen_warning = feedback_list[0]
-                self._active_warning = chosen_warning
-
-        # Determine desired feedback and level
-        if chosen_warning:
-            desired_feedback = chosen_warning
-            desired_level = 'error' if not frame_good_form else 'warning'
-        else:
-            desired_feedback = self.feedback
-            desired_level = 'success'
-            self._active_warning = None  # no warnings → clear lock
-
-        # Stabilization: rep-completion messages update immediately;
-        # warnings need N consistent candidate frames OR the hold time to expire.
-        # Include all possible valid and invalid rep messages as priority
-        rep_completion_msgs = (
-            set(REP_SUCCESS_MESSAGES) |
-            set(REP_INVALID_MESSAGES["depth"]) |
-            set(REP_INVALID_MESSAGES["form"]) |
-            set(REP_INVALID_MESSAGES["generic"]) |
-            {"Great depth, drive it up!"}
+        return self._build_result(
+            knee_angle, hip_angle, frame_good_form, is_deep_enough,
+            knee_y, hip_y, side_used,
         )
-        is_priority = desired_feedback in rep_completion_msgs
 
-        if desired_feedback == self._candidate_feedback:
-            self._candidate_count += 1
-        else:
-            self._candidate_feedback = desired_feedback
-            self._candidate_count = 1
-
-        time_since_stable = now - self._stable_feedback_time
-        should_update = (
-            is_priority
-            or self._candidate_count >= self._candidate_threshold
-            or (time_since_stable >= self.FEEDBACK_HOLD_TIME
-                and self._candidate_count >= 2)
+    def _is_still(self, side: str, pts: np.ndarray, knee_angle: float, hip_angle: float) -> bool:
+        """True when this frame can reuse the previous result.
+
+        Only quiescent stages qualify (UP between reps, BOTTOM hold),
+        and only once the warning counters and stabilizer have settled.
+        The reused result is an approximation: its angles match the
+        ungated path, but the form checks are not re-run on points that
+        moved by less than STILL_MAX_SHIFT_PX.
+        """
+        stage = self.stage
+        if stage != Stage.UP and stage != Stage.BOTTOM:
+            return False
+        result = self._result
+        if result["side_detected"] != side:
+            return False
+
+        # The smoothers keep running while gated, so the reported whole
+        # degrees stay exact; any change needs a full pass (the stage
+        # thresholds are whole degrees too)
+        if int(knee_angle) != result["knee_angle"] or int(hip_angle) != result["hip_angle"]:
+            return False
+
+        if not self._is_settled():
+            return False
+
+        # Last, the only array op: no point drifted from the last analysed
+        # frame by STILL_MAX_SHIFT_PX or more
+        return np.abs(pts - self._last_pts).max() < self.STILL_MAX_SHIFT_PX
+
+    def _is_settled(self) -> bool:
+        """True when no warning is pending and the default message is shown."""
+        if any(self._warn):
+            return False
+        stabilizer = self._stabilizer
+        return (
+            stabilizer.active_warning is None
+            and stabilizer.stable_feedback == self.feedback
+            and stabilizer.candidate_feedback == self.feedback
         )
 
-        if should_update and desired_feedback != self._stable_feedback:
-            self._stable_feedback = desired_feedback
-            self._stable_feedback_level = desired_level
-            self._stable_feedback_time = now
-
-        return {
-            "knee_angle": int(knee_angle),
-            "hip_angle": int(hip_angle),
-            "stage": self.stage,
-            "rep_count": self.counter,
-            "valid_reps": self.valid_reps,
-            "invalid_reps": self.invalid_reps,
-            "feedback": self._stable_feedback,
-            "feedback_level": self._stable_feedback_level,
-            "is_good_form": frame_good_form,
-            "depth_status": "Good" if is_deep_enough else "High",
-            "target_depth_y": knee_y,
-            "current_depth_y": hip_y,
-            "hip_trajectory": list(self.hip_history),
-            "side_detected": side_used,
-        }
+    def _build_result(self, knee_angle, hip_angle, frame_good_form, is_deep_enough,
+                      knee_y, hip_y, side_used) -> dict:
+        """Refill the analyzer's reused result dict for this frame."""
+        result = self._result
+        # Thresholds compare the smoothed floats; the UI shows whole degrees
+        result["knee_angle"] = int(knee_angle)
+        result["hip_angle"] = int(hip_angle)
+        result["stage"] = STAGE_NAMES[self.stage]
+        result["rep_count"] = self.counter
+        result["valid_reps"] = self.valid_reps
+        result["invalid_reps"] = self.invalid_reps
+        stabilizer = self._stabilizer
+        result["feedback"] = stabilizer.stable_feedback
+        result["feedback_level"] = stabilizer.stable_feedback_level
+        result["is_good_form"] = frame_good_form
+        result["depth_status"] = DEPTH_STATUS[is_deep_enough]
+        result["target_depth_y"] = knee_y
+        result["current_depth_y"] = hip_y
+        if self.include_trajectory:
+            result["hip_trajectory"] = self.hip_history.tolist()
+        result["side_detected"] = side_used
+        return result
 
     # ------------------------------------------------------------------
-    # Legacy local-webcam method
+    # Stage handlers (dispatched by ``self._stage_handlers``)
     # ------------------------------------------------------------------
-    def analyze(self, img, lm_list):
-        """Original method for local webcam testing with drawing."""
-        if len(lm_list) != 0:
-            left_v = lm_list[23][3] + lm_list[25][3] + lm_list[27][3]
-            right_v = lm_list[24][3] + lm_list[26][3] + lm_list[28][3]
-
-            if right_v >= left_v:
-                hip, knee, ankle = lm_list[24][1:3], lm_list[26][1:3], lm_list[28][1:3]
-            else:
-                hip, knee, ankle = lm_list[23][1:3], lm_list[25][1:3], lm_list[27][1:3]
-
-            angle_knee = calculate_angle(hip, knee, ankle)
-
-            cv2.putText(img, str(int(angle_knee)), (knee[0] + 10, knee[1]),
-                        cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
-
-            if angle_knee > 150:
-                self.stage = "up"
-            if angle_knee < 90 and self.stage == "up":
-                self.stage = "down"
+    def _record_form_issues(self, feedback_list: list[int]) -> None:
+        """Add this frame's warnings to the current rep's issue set."""
+        self._rep_form_issues.update(feedback_list)
+
+    def _handle_up(self, knee_angle, is_deep_enough, frame_good_form, feedback_list, now, low_confidence):
+        # Track whether the person has reached full standing after a rep.
+        # This adds a hysteresis band (145° lockout → 155° standing)
+        # that prevents oscillation near the lockout threshold from
+        # triggering a phantom descent cycle.
+        if knee_angle >= self.KNEE_STANDING_ANGLE:
+            self._reached_standing = True
+
+        if self._reached_standing and knee_angle < self.KNEE_LOCKOUT_ANGLE:
+            # Started descending
+            self.stage = Stage.DESCENDING
+            self._reached_standing = False
+            self._rep_form_issues = set()
+            self._rep_had_good_depth = False
+            self._deep_frame_count = 0
+            # Reset warning counters for the new rep
+            self._warn[:] = (0, 0, 0)
+
+    def _handle_descending(self, knee_angle, is_deep_enough, frame_good_form, feedback_list, now, low_confidence):
+        warn = self._warn
+
+        # Accumulate form issues while going down
+        if not frame_good_form:
+            self._record_form_issues(feedback_list)
+
+        if knee_angle <= self.KNEE_DEEP_ANGLE:
+            self._deep_frame_count += 1
+            warn[_DEEPER] = 0  # they're deep enough, reset
+        else:
+            self._deep_frame_count = self._deep_frame_count - 1 if self._deep_frame_count > 1 else 0
+            # Track how long they've been in a "not deep enough" zone
+            if knee_angle < self.KNEE_LOCKOUT_ANGLE:
+                warn[_DEEPER] += 1
+
+        if is_deep_enough:
+            self._rep_had_good_depth = True
+
+        # Only show depth cue if they've been hovering above depth for a while
+        if warn[_DEEPER] >= self.WARN_FRAMES_DEEPER and not is_deep_enough:
+            if WARN_DEEPER not in feedback_list:
+                feedback_list.append(WARN_DEEPER)
+
+        if self._deep_frame_count >= self.MIN_DEEP_FRAMES:
+            self.stage = Stage.BOTTOM
+            self.feedback = DEPTH_REACHED_MESSAGE
+
+        # If they pop back up without going deep enough
+        if knee_angle > self.KNEE_STANDING_ANGLE:
+            self.stage = Stage.UP
+            self._deep_frame_count = 0
+            warn[_DEEPER] = 0
+
+    def _handle_bottom(self, knee_angle, is_deep_enough, frame_good_form, feedback_list, now, low_confidence):
+        # Still at the bottom – keep tracking form
+        if not frame_good_form:
+            self._record_form_issues(feedback_list)
+
+        if is_deep_enough:
+            self._rep_had_good_depth = True
+
+        if knee_angle > self.KNEE_DEEP_ANGLE + 10:
+            # They've started coming up (reduced hysteresis for faster detection)
+            self.stage = Stage.ASCENDING
+
+    def _handle_ascending(self, knee_angle, is_deep_enough, frame_good_form, feedback_list, now, low_confidence):
+        if not frame_good_form:
+            self._record_form_issues(feedback_list)
+
+        if knee_angle >= self.KNEE_STANDING_ANGLE:
+            # ---- Rep completed! ----------------------------------------
+            time_since_last = now - self._last_rep_time
+
+            if time_since_last >= self.MIN_REP_INTERVAL and not low_confidence:
                 self.counter += 1
-                print("Squat count:", self.counter)
+                self._last_rep_time = now
+
+                # "Let's go a bit deeper" is guidance during descent, not a form error.
+                # If they followed through and achieved good depth, exclude it.
+                actual_form_issues = [
+                    issue for issue in self._rep_form_issues
+                    if issue != WARN_DEEPER or not self._rep_had_good_depth
+                ]
+
+                rep_is_valid = (
+                    len(actual_form_issues) == 0
+                    and self._rep_had_good_depth
+                )
+
+                if rep_is_valid:
+                    self.valid_reps += 1
+                    self.feedback = random.choice(REP_SUCCESS_MESSAGES)
+                else:
+                    self.invalid_reps += 1
+                    if not self._rep_had_good_depth:
+                        self.feedback = random.choice(REP_INVALID_MESSAGES["depth"])
+                    elif actual_form_issues:
+                        self.feedback = random.choice(REP_INVALID_MESSAGES["form"])
+                    else:
+                        self.feedback = random.choice(REP_INVALID_MESSAGES["generic"])
+
+                # Force-update stable feedback so rep result always displays
+                # (overrides mid-rep cues like "Great depth, drive it up!")
+                stabilizer = self._stabilizer
+                stabilizer.stable_feedback = self.feedback
+                stabilizer.stable_feedback_level = 'success' if rep_is_valid else 'warning'
+                stabilizer.stable_feedback_time = now
 
-            return img
+            self.stage = Stage.UP
+            self._deep_frame_count = 0
@@ -0,0 +1,58 @@
+"""
+Local-webcam squat analyzer (draws on the frame with OpenCV).
+
+Kept out of ``squat`` so the server, which only needs ``get_analysis``,
+never imports cv2 through the analyzer.
+"""
+
+import cv2
+
+from .base import Stage, calculate_angle
+from .squat import SquatAnalyzer
+
+
+class LocalSquatAnalyzer(SquatAnalyzer):
+    """SquatAnalyzer plus the original draw-on-image ``analyze`` method.
+
+    ``draw_every`` draws the knee-angle label on every Nth frame only
+    (default 1: every frame).  Raising it trims cv2 calls on slow
+    machines, at the cost of the label blinking on the skipped frames.
+    """
+
+    __slots__ = ("draw_every", "_frame_i")
+
+    def __init__(self, include_trajectory: bool = True, draw_every: int = 1):
+        super().__init__(include_trajectory)
+        self.draw_every = max(1, draw_every)
+        self._frame_i = 0
+
+    # ------------------------------------------------------------------
+    # Legacy local-webcam method
+    # ------------------------------------------------------------------
+    def analyze(self, img, lm_list):
+        """Original method for local webcam testing with drawing."""
+        if len(lm_list) != 0:
+            left_v = lm_list[23][3] + lm_list[25][3] + lm_list[27][3]
+            right_v = lm_list[24][3] + lm_list[26][3] + lm_list[28][3]
+
+            if right_v >= left_v:
+                hip, knee, ankle = lm_list[24][1:3], lm_list[26][1:3], lm_list[28][1:3]
+            else:
+                hip, knee, ankle = lm_list[23][1:3], lm_list[25][1:3], lm_list[27][1:3]
+
+            angle_knee = calculate_angle(hip, knee, ankle)
+
+            self._frame_i += 1
+            if self._frame_i >= self.draw_every:
+                self._frame_i = 0
+                cv2.putText(img, str(int(angle_knee)), (knee[0] + 10, knee[1]),
+                            cv2.FONT_HERSHEY_PLAIN, 2, (255, 255, 255), 2)
+
+            if angle_knee > 150:
+                self.stage = Stage.UP
+            if angle_knee < 90 and self.stage == Stage.UP:
+                self.stage = Stage.BOTTOM
+                self.counter += 1
+                print("Squat count:", self.counter)
+
+            return img
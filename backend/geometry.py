@@ -1,19 +1,48 @@
+import math
+
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover – numba is optional
+    njit = None
+
+
+def _angle_deg(ax, ay, bx, by, cx, cy):
+    radians = math.atan2(cy - by, cx - bx) - math.atan2(ay - by, ax - bx)
+    angle = abs(radians * 180.0 / math.pi)
+
+    if angle > 180.0:
+        angle = 360 - angle
+
+    return angle
+
+
+if njit is not None:
+    # Explicit signature → compiled eagerly at import (and cached on disk)
+    _angle_deg = njit(
+        "float64(float64, float64, float64, float64, float64, float64)",
+        cache=True, fastmath=True,
+    )(_angle_deg)
+
+
 def calculate_angle(a, b, c):
     """
     Calculates the angle between three points (a, b, c).
     b is the vertex of the angle.
     Returns the angle in degrees.
     """
-    a = np.array(a)  # First
-    b = np.array(b)  # Mid
-    c = np.array(c)  # End
+    return _angle_deg(a[0], a[1], b[0], b[1], c[0], c[1])
 
-    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
-    angle = np.abs(radians * 180.0 / np.pi)
 
-    if angle > 180.0:
-        angle = 360 - angle
-
-    return angle
+def calc_angles2(p_a, p_b, p_c):
+    """
+    Calculates several angles at once from parallel point arrays.
+    Row i of p_b is the vertex of angle i (arrays of shape (N, 2)).
+    Returns an (N,) array of angles in degrees.
+    """
+    v1 = p_a - p_b
+    v2 = p_c - p_b
+    cross = v1[:, 0] * v2[:, 1] - v1[:, 1] * v2[:, 0]
+    dot = v1[:, 0] * v2[:, 0] + v1[:, 1] * v2[:, 1]
+    return np.degrees(np.arctan2(np.abs(cross), dot))
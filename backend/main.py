@@ -2,15 +2,93 @@ import cv2
 import time
 import sys
 import os
+import queue
 import threading
 
 # Add the parent directory to sys.path to allow imports from backend
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.pose_tracker import PoseTracker
-from backend.exercises.squat import SquatAnalyzer
+from backend.exercises.squat_local import LocalSquatAnalyzer
 from backend.services.gemini_service import GeminiService
 
+# Frames allowed in flight between pipeline stages (bounds RAM and latency)
+PIPELINE_PREFETCH = 2
+
+
+def pose_pipeline(cap, tracker, gemini_service, prefetch=PIPELINE_PREFETCH):
+    """Yield ``(img, lm_list)`` from *cap*, with capture and pose detection on worker threads.
+
+    A reader thread grabs frames and a pose thread runs MediaPipe, each
+    feeding a bounded queue, so capture, inference and the caller's
+    analysis/drawing overlap instead of running back to back.  Analyzers
+    are stateful, so they stay with the caller on the main thread.
+    Closing the generator stops and joins the workers.
+    """
+    stop_event = threading.Event()
+    read_q = queue.Queue(maxsize=prefetch)
+    pose_q = queue.Queue(maxsize=prefetch)
+
+    def _put(q, item):
+        # Blocking put that still notices a shutdown request
+        while not stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(q):
+        while not stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _reader():
+        while True:
+            success, img = cap.read()
+            if not success:
+                print("Failed to read frame.")
+                _put(read_q, None)
+                return
+            # Add raw frame to buffer for Gemini
+            gemini_service.add_frame(img)
+            if not _put(read_q, img):
+                return
+
+    def _pose():
+        while True:
+            img = _get(read_q)
+            if img is None:
+                _put(pose_q, None)
+                return
+            # 1. Find Pose  2. Get Landmark Position
+            img = tracker.find_pose(img)
+            lm_list = tracker.get_position(img, draw=False)
+            if not _put(pose_q, (img, lm_list)):
+                return
+
+    workers = [
+        threading.Thread(target=_reader, daemon=True),
+        threading.Thread(target=_pose, daemon=True),
+    ]
+    for t in workers:
+        t.start()
+    try:
+        while True:
+            item = _get(pose_q)
+            if item is None:
+                return
+            yield item
+    finally:
+        stop_event.set()
+        for t in workers:
+            t.join(timeout=1.0)
+
+
 def main():
     cap = cv2.VideoCapture(0) # 0 for default webcam
     
@@ -20,7 +98,7 @@ def main():
         return
 
     tracker = PoseTracker()
-    squat_analyzer = SquatAnalyzer()
+    squat_analyzer = LocalSquatAnalyzer()
     
     # Initialize Gemini Service
     # Make sure GEMINI_API_KEY is set in your environment
@@ -33,23 +111,8 @@ def main():
     print("Press 'q' to quit.")
     print("Press 'c' to capture clip and ask Gemini.")
 
-    while True:
-        success, img = cap.read()
-        if not success:
-            print("Failed to read frame.")
-            break
-        
-        # Add raw frame to buffer for Gemini
-        # We might want to resize or compress before buffering if memory is an issue
-        # but for 2 seconds it should be fine.
-        gemini_service.add_frame(img)
-
-        # 1. Find Pose
-        img = tracker.find_pose(img)
-        
-        # 2. Get Landmark Position
-        lm_list = tracker.get_position(img, draw=False)
-        
+    frames = pose_pipeline(cap, tracker, gemini_service)
+    for img, lm_list in frames:
         # 3. Analyze Squat
         if len(lm_list) != 0:
             img = squat_analyzer.analyze(img, lm_list)
@@ -75,16 +138,16 @@ def main():
         if key == ord('q'):
             break
         elif key == ord('c'):
-            # Run analysis in a separate thread to avoid blocking the UI
-            def run_analysis():
+            # Run analysis on the service's worker thread to avoid blocking the UI
+            def show_response(future):
                 nonlocal gemini_response
-                gemini_response = "Analyzing..."
-                response = gemini_service.analyze_current_buffer()
-                gemini_response = response
-                print(f"Gemini Coach: {response}")
-            
-            threading.Thread(target=run_analysis).start()
+                gemini_response = future.result()
+                print(f"Gemini Coach: {gemini_response}")
+
+            gemini_response = "Analyzing..."
+            gemini_service.submit_analysis().add_done_callback(show_response)
             
+    frames.close()  # stop the capture/pose threads before releasing the camera
     cap.release()
     cv2.destroyAllWindows()
 
@@ -45,3 +45,42 @@ class PoseTracker:
                 if draw:
                     cv2.circle(img, (cx, cy), 5, (255, 0, 0), cv2.FILLED)
         return lm_list
+
+    def get_position_array(self, img):
+        """Landmarks as an (N, 4) float64 array of [id, x, y, visibility].
+
+        Same values as get_position (pixel coords truncated like int()),
+        but in one contiguous array so analyzers can take row/column views
+        instead of slicing per-landmark lists. Empty (0, 4) if no pose.
+        """
+        if not (self.results and self.results.pose_landmarks):
+            return np.empty((0, 4))
+        h, w = img.shape[:2]
+        landmarks = self.results.pose_landmarks[0]  # first pose
+        arr = np.array([
+            (idx, lm.x, lm.y, lm.visibility if getattr(lm, 'visibility', None) is not None else 0.0)
+            for idx, lm in enumerate(landmarks)
+        ], dtype=np.float64)
+        arr[:, 1] = np.trunc(arr[:, 1] * w)
+        arr[:, 2] = np.trunc(arr[:, 2] * h)
+        return arr
+
+
+# ---------------------------------------------------------------------------
+# Process-pool helpers – each worker process owns one PoseTracker.  The
+# landmarker runs in IMAGE mode (frames are independent), so any worker
+# can serve any client's frame.
+# ---------------------------------------------------------------------------
+_worker_tracker: PoseTracker | None = None
+
+
+def init_worker_tracker():
+    """ProcessPoolExecutor initializer: build this worker's PoseTracker."""
+    global _worker_tracker
+    _worker_tracker = PoseTracker()
+
+
+def detect_pose_array(img):
+    """Detect the pose in *img* inside a pool worker; returns get_position_array(img)."""
+    _worker_tracker.find_pose(img, draw=False)
+    return _worker_tracker.get_position_array(img)
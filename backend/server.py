@@ -5,14 +5,18 @@ import cv2
 import numpy as np
 import base64
 import asyncio
+import time
 import uuid
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
 from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from starlette.websockets import WebSocketState
 
+import pose_tracker
 from pose_tracker import PoseTracker
 from exercises import get_analyzer
 from exercises.squat import SquatAnalyzer
@@ -31,7 +35,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Form Check Agent API")
+# ---------------------------------------------------------------------------
+# Optional pose-detection process pool (POSE_WORKERS=N, default off).
+# With many simultaneous clients, MediaPipe inference in threads contends
+# for one interpreter; a pool spreads it across cores.  Analyzers stay in
+# this process – they are stateful per connection and take microseconds,
+# far less than shipping their state over IPC.
+# ---------------------------------------------------------------------------
+POSE_WORKERS = int(os.environ.get("POSE_WORKERS", "0"))
+pose_pool: ProcessPoolExecutor | None = None
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    global pose_pool
+    if POSE_WORKERS > 0:
+        pose_pool = ProcessPoolExecutor(
+            max_workers=POSE_WORKERS, initializer=pose_tracker.init_worker_tracker,
+        )
+        logger.info(f"Pose detection pool started ({POSE_WORKERS} workers)")
+    try:
+        yield
+    finally:
+        if pose_pool is not None:
+            pose_pool.shutdown(cancel_futures=True)
+            pose_pool = None
+
+
+app = FastAPI(title="Form Check Agent API", lifespan=_lifespan)
 
 # Allow CORS for Expo app
 app.add_middleware(
@@ -279,23 +310,37 @@ def _downscale(frame: np.ndarray, max_width: int = MEDIAPIPE_MAX_WIDTH) -> tuple
     return cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA), scale
 
 
+def _to_frame_coords(lm_list: np.ndarray, scale: float) -> np.ndarray:
+    """Map landmarks detected on a downscaled frame back to original-frame pixels."""
+    if scale != 1.0 and len(lm_list):
+        lm_list[:, 1:3] = np.trunc(lm_list[:, 1:3] / scale)
+    return lm_list
+
+
 def _process_frame_sync(
     frame: np.ndarray,
     tracker: PoseTracker,
-) -> list:
+) -> np.ndarray:
     """Run downscale + pose detection + landmark extraction in ONE thread call.
 
-    Returns the landmark list with coordinates in original-frame space.
+    Returns an (N, 4) [id, x, y, visibility] landmark array with
+    coordinates in original-frame space (N == 0 when no pose was found).
     """
     small, scale = _downscale(frame)
     tracker.find_pose(small, draw=False)
-    lm_list = tracker.get_position(small, draw=False)
-    if scale != 1.0 and lm_list:
-        lm_list = [
-            [lid, int(x / scale), int(y / scale), v]
-            for lid, x, y, v in lm_list
-        ]
-    return lm_list
+    return _to_frame_coords(tracker.get_position_array(small), scale)
+
+
+async def _process_frame_pooled(frame: np.ndarray) -> np.ndarray:
+    """Same as _process_frame_sync, with detection on the pose process pool.
+
+    Only the downscaled frame crosses the process boundary.
+    """
+    small, scale = await asyncio.to_thread(_downscale, frame)
+    lm_list = await asyncio.get_running_loop().run_in_executor(
+        pose_pool, pose_tracker.detect_pose_array, small,
+    )
+    return _to_frame_coords(lm_list, scale)
 
 
 @app.websocket("/ws/video")
@@ -317,13 +362,14 @@ async def websocket_video_endpoint(websocket: WebSocket):
     logger.info(f"[{conn_id}] WebSocket connection established ({len(active_connections)} active, exercise={ex})")
 
     # Per-session state
-    session_tracker = PoseTracker()
+    # (no per-session tracker when detection runs on the process pool)
+    session_tracker = PoseTracker() if pose_pool is None else None
     session_analyzer = get_analyzer(ex)
     current_session_id = str(uuid.uuid4())
     frame_seq = 0
 
     # Latest-frame slot – written by the reader, consumed by the processor
-    latest_frame: dict = {"frame": None, "seq": 0, "orientation": "portrait"}
+    latest_frame: dict = {"frame": None, "seq": 0, "ts": 0.0, "orientation": "portrait"}
     frame_event = asyncio.Event()
     connection_alive = True
 
@@ -359,6 +405,7 @@ async def websocket_video_endpoint(websocket: WebSocket):
 
             frame = slot["frame"]
             seq = slot["seq"]
+            frame_ts = slot["ts"]
 
             # Add frame to Gemini buffer (non-critical)
             try:
@@ -367,31 +414,44 @@ async def websocket_video_endpoint(websocket: WebSocket):
                 pass
 
             # Run downscale + MediaPipe in a SINGLE thread call
+            # (or on the pose process pool when one is configured)
             try:
-                lm_list = await asyncio.to_thread(
-                    _process_frame_sync, frame, session_tracker
-                )
+                if session_tracker is None:
+                    lm_list = await _process_frame_pooled(frame)
+                else:
+                    lm_list = await asyncio.to_thread(
+                        _process_frame_sync, frame, session_tracker
+                    )
             except Exception as e:
                 logger.error(f"[{conn_id}] Pose tracking error: {e}")
-                lm_list = []
+                lm_list = np.empty((0, 4))
 
             # Build response
             feedback = None
-            if lm_list:
+            if len(lm_list):
                 try:
 
-                    analysis = session_analyzer.get_analysis(lm_list)
+                    # Timed at arrival, so queueing/inference latency does
+                    # not skew the analyzers' rep-interval timing
+                    analysis = session_analyzer.get_analysis(lm_list, frame_ts)
 
                     h, w = frame.shape[:2]
-                    normalized_landmarks = [[lid, x / w, y / h, v]
-                                           for lid, x, y, v in lm_list]
+                    normalized = lm_list.copy()
+                    normalized[:, 1] /= w
+                    normalized[:, 2] /= h
+                    normalized_landmarks = normalized.tolist()
 
                     if analysis:
-                        analysis["target_depth_y"] = analysis["target_depth_y"] / h
-                        analysis["current_depth_y"] = analysis["current_depth_y"] / h
-                        analysis["hip_trajectory"] = [
-                            [x / w, y / h] for x, y in analysis["hip_trajectory"]
-                        ]
+                        # Analyzers may reuse their result dict across
+                        # frames, so normalise into a new dict.
+                        analysis = {
+                            **analysis,
+                            "target_depth_y": analysis["target_depth_y"] / h,
+                            "current_depth_y": analysis["current_depth_y"] / h,
+                            "hip_trajectory": [
+                                [x / w, y / h] for x, y in analysis["hip_trajectory"]
+                            ],
+                        }
 
                     feedback = {
                         "landmarks": normalized_landmarks,
@@ -441,6 +501,7 @@ async def websocket_video_endpoint(websocket: WebSocket):
                 frame_base64 = data.get("frame")
                 if not frame_base64:
                     continue
+                received_ts = time.monotonic()
 
                 # Track client-reported orientation (portrait / landscape)
                 client_orientation = data.get("orientation", "portrait")
@@ -460,6 +521,7 @@ async def websocket_video_endpoint(websocket: WebSocket):
                 frame_seq += 1
                 latest_frame["frame"] = frame
                 latest_frame["seq"] = frame_seq
+                latest_frame["ts"] = received_ts
                 latest_frame["orientation"] = client_orientation
                 frame_event.set()  # wake the processor
 
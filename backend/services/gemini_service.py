@@ -1,15 +1,122 @@
+import io
 import os
 import cv2
 import time
 import tempfile
+import threading
 import base64
-from collections import deque
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from fractions import Fraction
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
+try:
+    import av   # optional (`pip install av`): in-memory H.264 encode; cv2 fallback below
+except ImportError:  # pragma: no cover – PyAV not installed
+    av = None
+
 load_dotenv()
 
+# Model used for clip coaching cues
+CLIP_MODEL = "gemini-1.5-flash"
+
+# Number of recent clip → response pairs kept by GeminiService
+RESPONSE_CACHE_SIZE = 16
+
+# Clips are sent at most this tall and at every Nth buffered frame: a short
+# coaching cue needs far less than the capture resolution and frame rate
+CLIP_MAX_HEIGHT = 360
+CLIP_FRAME_STEP = 2
+
+# x264 settings for the PyAV encoder: CRF 30 is plenty for a coaching cue,
+# and the baseline profile keeps the clip decodable everywhere
+CLIP_X264_OPTIONS = {
+    "crf": "30", "preset": "veryfast", "tune": "zerolatency", "profile": "baseline",
+}
+
+# Clips up to this size are sent inline with the request (the API caps a
+# whole request at 20 MB); larger ones go through the File API
+INLINE_VIDEO_MAX_BYTES = 15 * 1024 * 1024
+
+# File API processing poll: first wait and cap (seconds), x1.5 per poll
+UPLOAD_POLL_START = 0.1
+UPLOAD_POLL_MAX = 1.0
+
+
+# A clip reuses a cached response when every pixel of its signature is
+# within this many 4-bit levels of the cached clip's (absorbs sensor noise
+# and exposure flicker; any real movement shifts some pixel much further)
+SIGNATURE_TOLERANCE = 1
+
+
+def _clip_signature(frames):
+    """Coarse look of a clip: 16x16 grayscale thumbnails of every 6th frame,
+    quantized to 4 bits, as bytes.
+    """
+    return np.stack([
+        cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (16, 16),
+                   interpolation=cv2.INTER_AREA) >> 4
+        for frame in frames[::6]
+    ]).tobytes()
+
+
+def _clip_frames(frames):
+    """Every CLIP_FRAME_STEP-th frame, scaled to at most CLIP_MAX_HEIGHT tall.
+
+    Both dimensions are kept even, as yuv420p H.264 requires.
+    """
+    height, width = frames[0].shape[:2]
+    if height > CLIP_MAX_HEIGHT:
+        width, height = round(width * CLIP_MAX_HEIGHT / height), CLIP_MAX_HEIGHT
+    size = (width - width % 2, height - height % 2)
+    return [
+        frame if frame.shape[1::-1] == size
+        else cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        for frame in frames[::CLIP_FRAME_STEP]
+    ]
+
+
+def _encode_clip_av(frames, fps):
+    """MP4 bytes via PyAV: H.264 baseline (x264, CRF 30), encoded entirely in memory."""
+    buf = io.BytesIO()
+    with av.open(buf, mode="w", format="mp4") as container:
+        stream = container.add_stream("libx264", rate=Fraction(fps).limit_denominator(1001))
+        stream.height, stream.width = frames[0].shape[:2]
+        stream.pix_fmt = "yuv420p"
+        stream.options = CLIP_X264_OPTIONS
+        for frame in frames:
+            container.mux(stream.encode(av.VideoFrame.from_ndarray(frame, format="bgr24")))
+        container.mux(stream.encode())   # flush
+    return buf.getvalue()
+
+
+def _encode_clip_cv2(frames, fps):
+    """MP4 bytes via cv2.VideoWriter: H.264 when the build has it, else MPEG-4."""
+    height, width = frames[0].shape[:2]
+    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_video:
+        temp_video_path = temp_video.name
+    try:
+        # usage of avc1 (H.264) is generally more compatible; pip builds of
+        # OpenCV often lack an H.264 encoder, so fall back to mp4v
+        for codec in ('avc1', 'mp4v'):
+            out = cv2.VideoWriter(temp_video_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+            if out.isOpened():
+                break
+        else:
+            raise ValueError("No MP4 video encoder available in OpenCV")
+
+        for frame in frames:
+            out.write(frame)
+        out.release()
+
+        with open(temp_video_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(temp_video_path)
+
 
 class GeminiService:
     def __init__(self, api_key=None, buffer_seconds=2, fps=30):
@@ -27,67 +134,135 @@ class GeminiService:
         self.fps = fps
         self.is_analyzing = False
 
+        # LRU cache: (exercise, _clip_signature(clip)) -> Gemini response text
+        self._response_cache: OrderedDict[tuple[str, bytes], str] = OrderedDict()
+
+        # One background worker: encode + upload + generate off the caller's thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini")
+        self._submit_lock = threading.Lock()
+        self._pending_analysis: Future | None = None   # outstanding submit_analysis job
+        if self.client:
+            self._executor.submit(self._warmup)
+
+    def _warmup(self):
+        """Open the client's connection (TLS, auth) before the first clip needs it.
+
+        A model metadata lookup is enough to do that and costs no tokens.
+        """
+        try:
+            self.client.models.get(model=CLIP_MODEL)
+        except Exception as e:
+            print(f"Gemini warm-up failed (will retry on first use): {e}")
+
     def add_frame(self, frame):
         """Adds a frame to the circular buffer."""
         self.frame_buffer.append(frame)
 
+    def submit_analysis(self, exercise_name="squat") -> Future:
+        """
+        Snapshots the buffer now and analyzes it on the background worker.
+        Returns a Future for the same text analyze_current_buffer returns;
+        the buffer keeps filling while the clip is encoded and uploaded.
+        While a submitted analysis is still queued or running, further
+        calls return that same Future instead of queueing another upload.
+        """
+        with self._submit_lock:
+            pending = self._pending_analysis
+            if pending is not None and not pending.done():
+                return pending
+            frames = list(self.frame_buffer)
+            pending = self._executor.submit(self._analyze_frames, frames, exercise_name)
+            self._pending_analysis = pending
+            return pending
+
+    def _cached_key(self, cache_key):
+        """Most recent cached key for the same exercise whose signature is
+        within SIGNATURE_TOLERANCE of this one, or None.
+        """
+        exercise_name, signature = cache_key
+        sig = np.frombuffer(signature, dtype=np.uint8).astype(np.int16)
+        for key in reversed(self._response_cache):
+            name, other = key
+            if name != exercise_name or len(other) != len(signature):
+                continue
+            if np.abs(sig - np.frombuffer(other, dtype=np.uint8)).max() <= SIGNATURE_TOLERANCE:
+                return key
+        return None
+
     def analyze_current_buffer(self, exercise_name="squat"):
         """
-        Saves the buffered frames to a temporary video file and sends it to Gemini.
-        Returns the text response.
+        Encodes the buffered frames as a short MP4 clip and sends it to Gemini.
+        Returns the text response; a clip whose signature is within
+        SIGNATURE_TOLERANCE of a recent one reuses that clip's response
+        instead of re-uploading.
         """
+        # Snapshot: the capture loop keeps appending while we work
+        return self._analyze_frames(list(self.frame_buffer), exercise_name)
+
+    def _analyze_frames(self, frames, exercise_name):
         if not self.client:
             return "Error: Gemini API key not configured."
         
         if self.is_analyzing:
             return "Analysis already in progress..."
         
-        if len(self.frame_buffer) < 30:  # Minimum 1 second
+        if len(frames) < 30:  # Minimum 1 second
             return "Not enough data for analysis."
 
+        cache_key = (exercise_name, _clip_signature(frames))
+        match = self._cached_key(cache_key)
+        if match is not None:
+            self._response_cache.move_to_end(match)
+            print(f"Reusing cached analysis for {exercise_name}")
+            return self._response_cache[match]
+
         self.is_analyzing = True
         print(f"Starting analysis for {exercise_name}...")
         
         try:
-            # 1. Save frames to temp video
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_video:
-                temp_video_path = temp_video.name
-            
-            height, width, layers = self.frame_buffer[0].shape
-            # usage of avc1 (H.264) is generally more compatible
-            fourcc = cv2.VideoWriter_fourcc(*'avc1')
-            out = cv2.VideoWriter(temp_video_path, fourcc, self.fps, (width, height))
-
-            for frame in self.frame_buffer:
-                out.write(frame)
-            out.release()
-            
-            print(f"Video saved to {temp_video_path}")
+            # 1. Encode the downsampled clip to MP4 bytes
+            clip = _clip_frames(frames)
+            clip_fps = self.fps / CLIP_FRAME_STEP
+            video_bytes = None
+            if av is not None:
+                try:
+                    video_bytes = _encode_clip_av(clip, clip_fps)
+                except Exception as e:
+                    print(f"PyAV encode failed, falling back to OpenCV: {e}")
+            if video_bytes is None:
+                video_bytes = _encode_clip_cv2(clip, clip_fps)
 
-            # 2. Upload using File API
-            print("Uploading to Gemini...")
-            with open(temp_video_path, 'rb') as f:
-                video_bytes = f.read()
-            
-            video_file = self.client.files.upload(
-                file=temp_video_path,
-                config=types.UploadFileConfig(mime_type="video/mp4")
-            )
-            
-            # Wait for processing
-            while video_file.state.name == "PROCESSING":
-                print('.', end='', flush=True)
-                time.sleep(1)
-                video_file = self.client.files.get(name=video_file.name)
-
-            if video_file.state.name == "FAILED":
-                raise ValueError(f"Video processing failed: {video_file.state.name}")
-            
-            print(f"\nVideo uploaded. Name: {video_file.name}")
+            print(f"Video encoded ({len(video_bytes)} bytes)")
+
+            # 2. Attach the clip: inline with the request when it fits,
+            #    otherwise via the File API (upload + processing poll)
+            if len(video_bytes) <= INLINE_VIDEO_MAX_BYTES:
+                video_part = types.Part.from_bytes(data=video_bytes, mime_type="video/mp4")
+            else:
+                print("Uploading to Gemini...")
+                video_file = self.client.files.upload(
+                    file=io.BytesIO(video_bytes),
+                    config=types.UploadFileConfig(mime_type="video/mp4")
+                )
+                
+                # Wait for processing, polling quickly at first and backing
+                # off, so a clip that is ready in 200 ms isn't held for 1 s
+                delay = UPLOAD_POLL_START
+                while video_file.state.name == "PROCESSING":
+                    print('.', end='', flush=True)
+                    time.sleep(delay)
+                    delay = min(delay * 1.5, UPLOAD_POLL_MAX)
+                    video_file = self.client.files.get(name=video_file.name)
+
+                if video_file.state.name == "FAILED":
+                    raise ValueError(f"Video processing failed: {video_file.state.name}")
+                
+                print(f"\nVideo uploaded. Name: {video_file.name}")
+                video_part = types.Part.from_uri(file_uri=video_file.uri, mime_type="video/mp4")
 
             # 3. Generate Content
             # Using stable Gemini 1.5 Flash
-            model_name = "gemini-1.5-flash"
+            model_name = CLIP_MODEL
             
             prompt = f"""
             You are a supportive, professional physical therapist coaching a client.
@@ -107,26 +282,28 @@ class GeminiService:
             
             print(f"Requesting analysis from {model_name}...")
             
-            # Using generate_content directly with file API
+            # Using generate_content directly with the attached clip
             response = self.client.models.generate_content(
                 model=model_name,
                 contents=[
                     types.Content(
                         parts=[
-                            types.Part.from_uri(file_uri=video_file.uri, mime_type="video/mp4"),
+                            video_part,
                             types.Part.from_text(text=prompt)
                         ]
                     )
                 ]
             )
             
-            # Cleanup
-            os.remove(temp_video_path)
-            # Consider deleting the file from Gemini storage too if needed
+            # Cleanup: for File API uploads, consider deleting the file
+            # from Gemini storage too if needed
             # self.client.files.delete(name=video_file.name)
             
             self.is_analyzing = False
             if response.text:
+                self._response_cache[cache_key] = response.text
+                if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
                 return response.text
             else:
                 return "No feedback generated."
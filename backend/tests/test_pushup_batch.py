@@ -0,0 +1,106 @@
+"""
+PushupAnalyzer.get_analysis_batch must match frame-by-frame get_analysis.
+
+Run from backend/:  python -m unittest discover tests
+"""
+
+import math
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+# ── Make backend/ importable when run from the repo root or backend/ ──
+_backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _backend not in sys.path:
+    sys.path.insert(0, _backend)
+
+from exercises import _kernels as K  # noqa: E402
+from exercises.pushup import PushupAnalyzer  # noqa: E402
+
+FPS = 30.0
+
+
+def make_stream(n_frames: int = 600, seed: int = 0) -> np.ndarray:
+    """Synthetic side-view push-ups as an (N, 33, 4) landmark array.
+
+    The elbow swings out and back (about 180° → 75° → 180°) every two
+    seconds while the body stays straight; pixel jitter keeps frames
+    from repeating, and visibility drifts so the side pick changes
+    partway through.
+    """
+    rng = np.random.default_rng(seed)
+    lm = np.zeros((n_frames, 33, 4))
+    lm[:, :, 0] = np.arange(33)
+    lm[:, :, 3] = 0.3
+    for i in range(n_frames):
+        phase = 0.5 - 0.5 * math.cos(2 * math.pi * i / (2 * FPS))   # 0 → 1 → 0
+        elbow_dx = 65.0 * phase
+        drop = 40.0 * phase                                           # chest lowers
+        # (shoulder, elbow, wrist, hip, ankle) – shared by both sides
+        points = (
+            (200.0, 200.0 + drop),
+            (200.0 + elbow_dx, 250.0 + drop / 2),
+            (200.0, 300.0),
+            (350.0, 210.0 + drop / 2),
+            (500.0, 220.0),
+        )
+        # Right side dominant for the first half, left for the second
+        right_vis, left_vis = (0.95, 0.6) if i < n_frames // 2 else (0.6, 0.95)
+        for ids, vis in (((12, 14, 16, 24, 28), right_vis), ((11, 13, 15, 23, 27), left_vis)):
+            for idx, (x, y) in zip(ids, points):
+                lm[i, idx, 1] = math.trunc(x + rng.uniform(-3, 3))
+                lm[i, idx, 2] = math.trunc(y + rng.uniform(-3, 3))
+                lm[i, idx, 3] = vis + rng.uniform(-0.05, 0.05)
+    return lm
+
+
+class PushupBatchTest(unittest.TestCase):
+
+    def _live(self, lm: np.ndarray, start: float) -> list[dict]:
+        analyzer = PushupAnalyzer()
+        # The still-pose reuse gate is a live-only shortcut; the batch
+        # pass always analyses every frame, so compare against that
+        with mock.patch.object(PushupAnalyzer, "_is_still", lambda self, *a: False):
+            return [dict(analyzer.get_analysis(frame, start + i / FPS))
+                    for i, frame in enumerate(lm)]
+
+    def _batch(self, lm: np.ndarray, start: float, split: int) -> list[dict]:
+        analyzer = PushupAnalyzer()
+        with mock.patch("exercises.pushup.time.monotonic", return_value=start):
+            results = analyzer.get_analysis_batch(lm[:split], fps=FPS)
+        with mock.patch("exercises.pushup.time.monotonic", return_value=start + split / FPS):
+            results += analyzer.get_analysis_batch(lm[split:], fps=FPS)
+        return results
+
+    def _assert_matches(self):
+        lm = make_stream()
+        start = 1000.0
+        live = self._live(lm, start)
+        batch = self._batch(lm, start, split=250)
+
+        self.assertEqual(len(live), len(batch))
+        self.assertGreater(live[-1]["rep_count"], 0)
+        self.assertEqual({r["side_detected"] for r in live}, {"left", "right"})
+        for i, (a, b) in enumerate(zip(live, batch)):
+            self.assertEqual(a, b, f"frame {i}")
+
+    def test_batch_rejects_missing_visibility(self):
+        # (N, 33, 3) has no visibility column; the kernels index column 3
+        with self.assertRaises(ValueError):
+            PushupAnalyzer().get_analysis_batch(np.random.rand(5, 33, 3))
+
+    @unittest.skipUnless(K.HAVE_NUMBA, "numba not installed")
+    def test_batch_matches_live_numba(self):
+        with mock.patch.object(K, "pushup_batch", K.pushup_batch_kernel):
+            self._assert_matches()
+
+    def test_batch_matches_live_numpy(self):
+        with mock.patch.object(K, "pushup_batch", K.pushup_batch_numpy):
+            self._assert_matches()
+
+
+if __name__ == "__main__":
+    unittest.main()
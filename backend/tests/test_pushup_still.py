@@ -0,0 +1,106 @@
+"""
+The live still-pose gate must not let a held push-up pose drift away from
+the ungated analyzer.
+
+Run from backend/:  python -m unittest discover tests
+"""
+
+import math
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+# ── Make backend/ importable when run from the repo root or backend/ ──
+_backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _backend not in sys.path:
+    sys.path.insert(0, _backend)
+
+from exercises.pushup import PushupAnalyzer  # noqa: E402
+
+FPS = 30.0
+
+# Reported angles (whole degrees) must match exactly; the depth markers of
+# a reused result may lag by less than the gate's own point tolerance
+ANGLE_TOLERANCE = 0
+DEPTH_TOLERANCE_PX = PushupAnalyzer.STILL_MAX_SHIFT_PX
+
+
+def make_held_stream(n_frames: int = 900, seed: int = 0) -> list[list]:
+    """Push-ups with long holds, as per-frame ``[id, x, y, visibility]`` lists.
+
+    Every 300 frames: 30 frames down, a 100-frame hold at the bottom, 30
+    frames up, then 140 frames held at the top.  Landmarks flicker by
+    a whole pixel now and then, which keeps the raw angles moving inside
+    the hold.
+    """
+    rng = random.Random(seed)
+    frames = []
+    for i in range(n_frames):
+        ph = i % 300
+        if ph < 30:
+            t = ph / 30
+        elif ph < 130:
+            t = 1.0
+        elif ph < 160:
+            t = 1 - (ph - 130) / 30
+        else:
+            t = 0.0
+        elbow = math.radians(172 - 92 * t)
+        # (shoulder, elbow, wrist, hip, ankle) on the right side
+        points = {
+            12: (300, 200),
+            14: (300, 300),
+            16: (300 + 100 * math.sin(elbow), 300 - 100 * math.cos(elbow)),
+            24: (450, 205),
+            28: (600, 210),
+        }
+        lm = [[k, 10, 10, 0.2] for k in range(33)]
+        for idx, (x, y) in points.items():
+            lm[idx] = [idx, round(x + rng.uniform(-0.7, 0.7)),
+                       round(y + rng.uniform(-0.7, 0.7)), 0.95]
+        frames.append(lm)
+    return frames
+
+
+class PushupStillGateTest(unittest.TestCase):
+
+    def _run(self, frames, gated: bool) -> tuple[list[dict], int]:
+        analyzer = PushupAnalyzer()
+        real_is_still = PushupAnalyzer._is_still
+        skipped = 0
+
+        def is_still(self, *args):
+            nonlocal skipped
+            still = gated and real_is_still(self, *args)
+            skipped += bool(still)
+            return still
+
+        random.seed(0)   # rep messages are picked at random
+        with mock.patch.object(PushupAnalyzer, "_is_still", is_still):
+            results = [dict(analyzer.get_analysis(frame, 1000.0 + i / FPS))
+                       for i, frame in enumerate(frames)]
+        return results, skipped
+
+    def test_held_pose_stays_within_tolerance(self):
+        for seed in range(3):
+            frames = make_held_stream(seed=seed)
+            gated, skipped = self._run(frames, gated=True)
+            ungated, _ = self._run(frames, gated=False)
+
+            self.assertGreater(skipped, 50, "gate never engaged")
+            self.assertGreater(ungated[-1]["rep_count"], 0)
+            for i, (a, b) in enumerate(zip(gated, ungated)):
+                msg = f"seed {seed}, frame {i}"
+                self.assertLessEqual(abs(a["knee_angle"] - b["knee_angle"]), ANGLE_TOLERANCE, msg)
+                self.assertLessEqual(abs(a["hip_angle"] - b["hip_angle"]), ANGLE_TOLERANCE, msg)
+                self.assertLess(abs(a["target_depth_y"] - b["target_depth_y"]), DEPTH_TOLERANCE_PX, msg)
+                self.assertLess(abs(a["current_depth_y"] - b["current_depth_y"]), DEPTH_TOLERANCE_PX, msg)
+                for key in ("stage", "rep_count", "valid_reps", "invalid_reps",
+                            "feedback", "depth_status", "side_detected"):
+                    self.assertEqual(a[key], b[key], f"{msg}, {key}")
+
+
+if __name__ == "__main__":
+    unittest.main()